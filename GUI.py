@@ -1,11 +1,13 @@
 import tkinter as tk
 from tkinter import messagebox
+from tkinter import filedialog
 import datetime
 import entityHandler
 import pdfProduction
 import passwordManagememt
 import emailSender
 import validator
+import dataImport
 from decimal import Decimal
 
 
@@ -48,7 +50,13 @@ class GUIController(tk.Tk):
         # When the red button (to close the window) is pressed, the function closingSave is called
         self.protocol("WM_DELETE_WINDOW", self.__closingSave)
         self.__user = None
-        self.__handler = entityHandler.EntityHandler()
+        """The database is loaded by a background thread (User accounts first, so they are ready for the Login window) 
+        rather than before the window can be shown"""
+        self.__handler = entityHandler.EntityHandler(preload=["User"])
+        # Saving any changes to the database in the background every 30 seconds
+        self.__handler.startAutosave(30)
+        # Checking every 5 seconds whether any changes could not be saved because another user changed the same record
+        self.after(5000, self.__checkConflicts)
         # Creating a dictionary called self.__frames containing all the possible tkinter window objects (the pages)
         self.__frames = {"Teacher": TeacherForm(self.__frame, self), "Note": NoteForm(self.__frame, self),
                        "Assistant": AssistantForm(self.__frame, self), "NewRecord": NewRecordPage(self.__frame, self), "UserAccountList": UserAccountList(self.__frame, self),
@@ -63,6 +71,11 @@ class GUIController(tk.Tk):
         self.__currentframe = self.__frames["Home"]
         self.showPage("Home")
 
+    def loadHome(self):
+        """This function fills the Home page with today's classes and this month's events. It is called once the user
+        has logged in, so the Login window does not have to wait for those records to be loaded."""
+        self.__frames["Home"].set()
+
     def setAccessLevel(self, level):
         self.__accessLevel = level
 
@@ -78,10 +91,29 @@ class GUIController(tk.Tk):
         self.__closingSave()
 
     def __closingSave(self):
-        """This function destroys the tkinter instance (closes the GUI) and makes a call to the entityHandler to save the
-        database to a file."""
+        """This function hides the GUI and makes a call to the entityHandler to stop the autosave and save any changes
+        that have not been saved yet. Any conflicts found by that save are shown before the tkinter instance is
+        destroyed (the GUI is closed)."""
+        self.withdraw()
+        self.__handler.close()
+        self.__showConflicts()
         self.destroy()
-        self.__handler.saveFile()
+
+    def __checkConflicts(self):
+        """This function shows any conflicts found by the autosave and then schedules itself to run again"""
+        self.__showConflicts()
+        self.after(5000, self.__checkConflicts)
+
+    def __showConflicts(self):
+        """This function gets the records whose changes could not be saved because another user saved a change to the
+        same record first, and if there are any tells the user which ones they were"""
+        conflicts = self.__handler.getConflicts()
+        if len(conflicts) > 0:
+            message = "The following records were changed by another user at the same time, so your changes to them " \
+                      "were not saved:\n"
+            for conflict in conflicts:
+                message += conflict[0] + " " + str(conflict[1]) + "\n"
+            tk.messagebox.showinfo("Conflict", message)
 
     def showPage(self, page):
         """This public function takes a text string 'page' as its input and makes a call to the private setPage function
@@ -470,27 +502,6 @@ class PersonForm(Form):
             self.removeNoteList()
         return self.entityHandler.updateRecord(self.getType(), self.getID(), data)
 
-    def __validateHouseNumber(self, string):
-        """This function takes a string as its input and returns a string 'message' which determines whether or not the input
-        is a valid house number"""
-        message = ""
-        # Ensuring the number is no longer than 5 digits
-        if len(string) > 5:
-            message = "House number too long"
-        # Ensuring the number contains only numerical characters or is blank
-        if not string.isdigit() and string != "":
-            message = "This is not a number"
-        return message
-
-    def __validateMedicalDetails(self, string):
-        """This function takes a string as its input and returns a string 'message' which determines whether or not the input
-        is valid medical details"""
-        message = ""
-        # Ensuring the input is not longer than 250 characters
-        if len(string) > 250:
-            message = "Description too long"
-        return message
-
     def validate(self):
         """This function validates the data that has been entered into the entry fields. If it is valid then the record
         is updates, otherwise error messages appear."""
@@ -504,8 +515,11 @@ class PersonForm(Form):
         errors[3] = validator.validateEmail(data[3])
         errors[4] = validator.validateContactNumber(data[4])
         errors[5] = validator.validatePostcode(data[5])
-        errors[6] = self.__validateHouseNumber(data[6])
-        errors[7] = self.__validateMedicalDetails(data[7])
+        errors[6] = validator.validateHouseNumber(data[6])
+        errors[7] = validator.validateMedicalDetails(data[7])
+        # If a new record is being created, check the same person has not already been added
+        if self.getID() is None and len(self.entityHandler.findDuplicates(self.getType(), data)) > 0:
+            errors[0] = "This person already exists"
         validated = True
         # Checking if any messages in errors are not an empty string (i.e. an error has been found)
         for i in errors:
@@ -983,6 +997,36 @@ class NewRecordPage(tk.Frame):
             count += 1
         title = tk.Label(self, font=('Arial', 24, 'bold'), text="New Record")
         title.grid(row=0, padx=10, pady=(10, 0), columnspan=count)
+        # The following buttons import many people at once from a CSV or JSONL file
+        count = 0
+        for i in ["Teacher", "Assistant", "Student"]:
+            if i == "Teacher":
+                # As above, only an admin can import Teachers
+                button = tk.Button(self, text="Import " + i + "s",
+                                   command=lambda i=i: self.__importFile(i) if self.__master.checkAdmin() else None)
+            else:
+                button = tk.Button(self, text="Import " + i + "s", command=lambda i=i: self.__importFile(i))
+            button.grid(row=3, column=count, padx=10, pady=10)
+            count += 1
+
+    def __importFile(self, entityType):
+        """This function takes the type of person to import. It asks the user to choose a CSV or JSONL file and imports
+        the records in it using a BulkImporter. The number of records imported is shown, and if any rows were invalid
+        the user can save a report of the errors."""
+        filename = filedialog.askopenfilename(title="Import " + entityType + "s",
+                                              filetypes=[("CSV or JSONL files", "*.csv *.jsonl")])
+        if filename:
+            importer = dataImport.BulkImporter(self.__master.getEntityHandler())
+            count = importer.importFile(filename, entityType)
+            errors = importer.getErrors()
+            message = str(count) + " records were imported."
+            if len(errors) == 0:
+                messagebox.showinfo("Import", message)
+            elif messagebox.askyesno("Import", message + " " + str(len(errors)) + " errors were found. Do you want to "
+                                                                                "save a report of the errors?"):
+                reportName = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files", "*.csv")])
+                if reportName:
+                    importer.writeReport(reportName)
 
     def windowTitle(self):
         return "New Record"
@@ -1000,7 +1044,7 @@ class UniformPage(tk.Frame):
         addButton = tk.Button(self, text="Create Uniform Item", command=self.__uniformType)
         addButton.grid(row=2, column=0, padx=10, pady=10)
         viewButton = tk.Button(self, text="View Uniform Orders", command=lambda: [self.__master.showPage("UniformOrderList"),
-                                                                                  self.__master.getCurrentPage().getCurrent()])
+                                                                                  self.__master.getCurrentPage().refresh()])
         viewButton.grid(row=2, column=1, padx=10, pady=10)
         orderButton = tk.Button(self, text="Order Uniform", command=lambda: [self.__master.showPage("UniformOrderForm"),
                                                                              self.__master.createCurrentPage()])
@@ -1118,12 +1162,14 @@ class UniformOrderForm(tk.Frame):
             message = "No Items"
         # If no error message has been generated then create a UniformOrder record and the UniformOrderLine records for each row
         if message == "":
-            # Setting the ID of the order to the result of calling update record where the type, current ID, and list of data is passed
-            self.__ID = self.__handler.updateRecord("UniformOrder", self.__ID, [self.__studentID, self.__fields[1].get(), self.__fields[2].get()])
-            for row in self.__rows:
-                # Getting the values from a UniformOrderLine and creating a matching record with this data
-                values = row.getValues()
-                self.__handler.updateRecord("UniformOrderLine", None, [self.__ID, values[0], values[3], values[2], values[1], values[4]])
+            # Saving the order and all of its lines together, so the order is never saved without some of its lines
+            with self.__handler.batch():
+                # Setting the ID of the order to the result of calling update record where the type, current ID, and list of data is passed
+                self.__ID = self.__handler.updateRecord("UniformOrder", self.__ID, [self.__studentID, self.__fields[1].get(), self.__fields[2].get()])
+                for row in self.__rows:
+                    # Getting the values from a UniformOrderLine and creating a matching record with this data
+                    values = row.getValues()
+                    self.__handler.updateRecord("UniformOrderLine", None, [self.__ID, values[0], values[3], values[2], values[1], values[4]])
             self.__master.showPage("UniformPage")
         else:
             # If an error message has been generated then show this in a pop-up tkinter box
@@ -1176,11 +1222,11 @@ class UniformOrderForm(tk.Frame):
         self.__fields[1].set(values[1])
         self.__fields[2].set(values[2])
         # Getting the UniformOrderLines which contain the order ID passed to the function as a foreign key
-        rows = self.__handler.getOrderLines(self.__ID)
+        rows = self.__handler.getOrderLineData(self.__ID)
         for row in rows:
             """For all of the UniformOrderLines, get the data contained within them and storing this in values. Then a 
             new instance of a tkinter OrderLineView object is created and values is passed to it. This is shown on a new row."""
-            values = self.__handler.getData("UniformOrderLine", row)
+            values = row[1]
             # Getting the view string for the student matching the foreign key (ID) within values
             values[1] = self.__searcher.getView("UniformType", values[1])
             lineView = OrderLineView(self, values)
@@ -1280,11 +1326,18 @@ class RecordList(tk.Frame):
         deleteButton.grid(row=11, column=1, padx=10, pady=10, sticky='N')
         viewButton = tk.Button(self, text="*", command=self.__view)
         viewButton.grid(row=10, column=1, padx=10, pady=10, sticky='S')
+        """True if the list may be out of date and needs to be fetched again when it is next shown (see refresh). The 
+        list starts out of date, so the records are only loaded when it is first shown rather than before the Login 
+        window appears."""
+        self.__stale = True
+        # Keeping the list up to date by changing only the rows affected by each change to the database
+        self.__handler.subscribe(self.__onChange)
 
     def getCurrent(self):
         """This function gets all of the records matching the type (self.__type) and shows them in the list"""
         self.__items = []
         self.__box.delete(0, tk.END)
+        self.__stale = False
         # Getting all the records matching type (self.__type) and storing the returned values in the variable records
         records = self.__searcher.search("", [self.__type])
         if len(records) > 0:
@@ -1292,16 +1345,50 @@ class RecordList(tk.Frame):
         for record in records:
             # Appending record (the ID of a record) to self.__items
             self.__items.append(record)
-            # Get the string to visually identify record by calling getView
-            values = self.__searcher.getView(self.__type, record)
-            if self.__type == "UniformOrder":
-                """If the record is of type UniformOrder then the view string consists of the name of the student the 
-                order is for and the date of the order"""
-                view = str(self.__searcher.getView("Student", values[0])) + " - " + values[1]
-            else:
-                view = values
             # Inserting the view string into the list of records
-            self.__box.insert(tk.END, view)
+            self.__box.insert(tk.END, self.__getViewString(record))
+
+    def refresh(self):
+        """This function fetches the records in the list again, but only if the list may be out of date"""
+        if self.__stale:
+            self.getCurrent()
+
+    def __getViewString(self, record):
+        """This function takes the ID of a record in the list and returns the string that identifies it in the list"""
+        # Get the string to visually identify record by calling getView
+        values = self.__searcher.getView(self.__type, record)
+        if self.__type == "UniformOrder":
+            """If the record is of type UniformOrder then the view string consists of the name of the student the 
+            order is for and the date of the order"""
+            return str(self.__searcher.getView("Student", values[0])) + " - " + values[1]
+        return values
+
+    def __onChange(self, event):
+        """This function is called by the entityHandler with a list describing a change to the database (see
+        entityHandler.subscribe). If the change is to a record of the type in the list then only its row is changed."""
+        # If the list is out of date it is fetched again when it is shown, so it is not changed now
+        if self.__stale:
+            return
+        if event[0] == "reloaded":
+            # This is called by the thread saving the database, so the list is fetched again next time it is shown
+            if event[1] == self.__type:
+                self.__stale = True
+        elif event[1] == self.__type:
+            ID = event[2]
+            if event[0] == "created":
+                self.__items.append(ID)
+                self.__box.insert(tk.END, self.__getViewString(ID))
+            elif event[0] == "updated" and ID in self.__items:
+                index = self.__items.index(ID)
+                self.__box.delete(index, index)
+                self.__box.insert(index, self.__getViewString(ID))
+            elif event[0] == "deleted" and ID in self.__items:
+                index = self.__items.index(ID)
+                self.__box.delete(index, index)
+                self.__items.pop(index)
+        elif self.__type == "UniformOrder" and event[1] == "Student" and event[0] == "updated":
+            # The rows of uniform orders show the name of the student, which may have changed
+            self.__stale = True
 
     def set(self, type, name):
         """This function takes variables type and string as its input and sets the corresponding private attributes to these"""
@@ -1323,14 +1410,23 @@ class RecordList(tk.Frame):
             self.__master.viewCurrentPage(self.__items[self.__box.curselection()[0]])
 
     def __delete(self):
-        """This function deletes the selected records in the list from the database."""
-        selected = self.__box.curselection()
+        """This function deletes the selected records in the list from the database. All of the selected records are
+        deleted by the entityHandler in one call."""
+        selected = list(self.__box.curselection())
+        items = []
         for index in selected:
+            items.append(self.__items[index])
+        # Removing the selected records from the list starting at the end, so the indexes of the others do not change
+        for index in reversed(selected):
             self.__box.delete(index, index)
-            # Removing the record at index in the list of records
-            item = self.__items[index]
             self.__items.pop(index)
-            self.__handler.deleteRecord(self.__type, item)
+        self.deleteItems(items)
+
+    def deleteItems(self, items):
+        """This function takes a list of the IDs of records of the type in the list and deletes them from the database.
+        Child classes can override it if their records need to be deleted differently."""
+        self.__handler.deleteRecords(self.__type, items)
+        for item in items:
             """Calling customDelete which may be necessary for child classes to delete all database records relating to 
             the selected record in this widget"""
             self.customDelete(item)
@@ -1346,15 +1442,14 @@ class UniformOrderList(RecordList):
     def __init__(self, container, master):
         """This constructor takes the container of the tkinter window and the master controller as an input."""
         RecordList.__init__(self, container, master)
+        self.__handler = master.getEntityHandler()
         # Setting the type to "UniformOrder" and the name of the record type displayed to "Uniform Order"
         self.set("UniformOrder", "Uniform Order")
-        # Refreshing the list of records
-        self.getCurrent()
 
-    def customDelete(self, item):
-        """This function takes the input of variable item (the ID of a UniformOrder) and deletes any UniformOrderLines
-        containing item as a foreign key."""
-        self.__handler.deleteOrderLines(item)
+    def deleteItems(self, items):
+        """This function takes a list of the IDs of UniformOrders and deletes them, along with any UniformOrderLines
+        containing them as a foreign key, in one call to the entityHandler."""
+        self.__handler.deleteOrders(items)
 
 
 class UserAccountList(RecordList):
@@ -1364,8 +1459,6 @@ class UserAccountList(RecordList):
         RecordList.__init__(self, container, master)
         # Setting the type to "User" and the name of the record type displayed to "User"
         self.set("User", "User")
-        # Refreshing the list of records
-        self.getCurrent()
 
 
 class NoteList(tk.Frame):
@@ -1387,12 +1480,12 @@ class NoteList(tk.Frame):
         # Creating a variable to store the ID of the record the notes are stored about
         self.__recordID = None
 
-    def setList(self, ID):
+    def setList(self, ID, count=None):
         """This function takes the ID of the record to find Note records for as an input. It then displays these notes
-        in a list of buttons."""
+        in a list of buttons, newest first. If count is given only the newest count notes are displayed."""
         self.__recordID = ID
-        # Getting all of the notes with foreign key of self.__recordID
-        notesList = self.__searcher.getNotes(self.__recordID)
+        # Getting the notes with foreign key of self.__recordID
+        notesList = self.__searcher.getNotes(self.__recordID, count)
         _row = 10
         _column = 0
         # Deleting any previous buttons that navigated to a note
@@ -1600,7 +1693,7 @@ class UserForm(Form):
         errors[0] = self.__validateUsername(data[0])
         errors[1] = self.__validatePassword(data[1])
         errors[2] = self.__validateConfirm(data[1], data[2])
-        errors[3] = validator.validateEmail(data[3])
+        errors[3] = self.__validateEmail(data[0], data[3])
         errors[4] = ""
         validated = True
         for i in errors:
@@ -1621,6 +1714,17 @@ class UserForm(Form):
                 self.errors[count].set(i)
                 count += 1
 
+    def __validateEmail(self, username, email):
+        """This function takes a username and an email address as its input and returns a string 'message' which
+        determines whether or not the input is a valid email address for that user"""
+        message = validator.validateEmail(email)
+        # Ensuring no other user account already uses the email address
+        if message == "":
+            for otherUsername in self.__handler.lookup("User", "email", email):
+                if otherUsername != username:
+                    message = "This email is already used"
+        return message
+
     def __validatePassword(self, password):
         """This function takes a string as its input and returns a string 'message' which determines whether or not the input
         is a valid password"""
@@ -1839,6 +1943,8 @@ class EntityPicker(tk.Frame):
         self.__viewButton.grid(row=2, column=1)
         self.__deleteButton = tk.Button(self, text="X", command=self.__delete)
         self.__deleteButton.grid(row=1, column=1)
+        # Keeping the list up to date as records are linked to (or unlinked from) the parent record
+        self.__handler.subscribe(self.__onChange, [self.__relationship, self.__searchType])
 
     def __view(self):
         """This function allows the record selected in the picker to be show in its corresponding form. With the form
@@ -1890,19 +1996,44 @@ class EntityPicker(tk.Frame):
             # The result of a search in selection mode self.__state with filter type self.__searchType is stored in new
             new = searchWidget.setMode(self.__state, [self.__searchType])
             if len(new) > 0:
-                # If the user has returned records from the search, create a relationship between each and self.__parentID
-                for record in new[self.__searchType]:
-                    self.__handler.createRelationship(self.__relationship, self.__parentID, record)
-            # Refresh the list of records in the EntityPicker
-            self.__getCurrent()
+                """If the user has returned records from the search, create a relationship between each and 
+                self.__parentID. The new records are added to the list by __onChange."""
+                self.__handler.createRelationships(self.__relationship, self.__parentID, new[self.__searchType])
 
     def __delete(self):
         """This funnction deletes any selected records from the EntityPicker"""
-        indexes = list(self.__box.curselection())
-        for index in indexes:
-            # Delete the relationship of type self.__relationship involving the record of ID at self.__list[index] and self.__parentID
-            self.__handler.deleteEntityRelationship(self.__relationship, self.__list[index], self.__parentID)
-        self.__getCurrent()
+        IDs = []
+        for index in list(self.__box.curselection()):
+            IDs.append(self.__list[index])
+        for ID in IDs:
+            """Delete the relationship of type self.__relationship involving the record of ID and self.__parentID. The 
+            record is removed from the list by __onChange."""
+            self.__handler.deleteEntityRelationship(self.__relationship, ID, self.__parentID)
+
+    def __onChange(self, event):
+        """This function is called by the entityHandler with a list describing a change to the relationship or the type
+        of record in the EntityPicker (see entityHandler.subscribe) and changes only the affected row"""
+        if self.__parentID is None:
+            return
+        if event[0] in ["linked", "unlinked"]:
+            # Finding the record at the other end of the relationship from the parent record
+            if event[3] == self.__parentID:
+                other = event[4]
+            elif event[4] == self.__parentID:
+                other = event[3]
+            else:
+                return
+            if event[0] == "linked" and other not in self.__list:
+                self.__box.insert(tk.END, self.__searcher.getView(self.__searchType, other))
+                self.__list.append(other)
+            elif event[0] == "unlinked" and other in self.__list:
+                index = self.__list.index(other)
+                self.__box.delete(index, index)
+                self.__list.pop(index)
+        elif event[0] == "updated" and event[1] == self.__searchType and event[2] in self.__list:
+            index = self.__list.index(event[2])
+            self.__box.delete(index, index)
+            self.__box.insert(index, self.__searcher.getView(self.__searchType, event[2]))
 
     def setState(self, state):
         """This function takes a string variable state as its input and sets the state of the EntityPicker's buttons
@@ -2278,22 +2409,19 @@ class FinanceCalculator(tk.Frame):
         else:
             # If the record is of type Class then it will only be on one day
             days = 1
-        # Getting the ID of the Venue the class/event takes place in by passing getForeigns the type 'Venue' and the class/event ID
-        venue = self.__handler.getForeigns(("Venue" + theKey), ID)
-        check = False
-        # Checking if the class/event actually has an event stored for it
-        if len(venue) > 0:
-            theVenue = venue[0][1]
-            check = True
-        if check:
+        # Getting the ID of the Venue the class/event takes place in by passing getVenue the type and the class/event ID
+        theVenue = self.__handler.getVenue(theKey, ID)
+        # Getting the number of students, teachers and assistants linked to the class/event
+        counts = self.__handler.getLinkCounts(theKey, ID)
+        # Checking if the class/event actually has a venue stored for it
+        if theVenue is not None:
             # If the class/event has a Venue foreign key, then calculate and display the finance for the class/event
             venueCost = self.__handler.getCost(theVenue) # Getting the hourly hire cost of the venue
             # Getting the number of hours the class/event takes place over by multipying the period of time by number of days
             period = time * days
-            """Getting the number of teacher and assistants in the class by finding the number of Teacher(Class/Event) 
-            and Assistant(Class/Event) relationships that exist involving the class/event matching ID."""
-            teacherNo = len(self.__handler.getForeigns(("Teacher" + theKey), ID))
-            assistantNo = len(self.__handler.getForeigns(("Assistant" + theKey), ID))
+            # Getting the number of teachers and assistants in the class/event matching ID
+            teacherNo = counts["Teacher"]
+            assistantNo = counts["Assistant"]
             """Calculating the outgoings by the sum of the product of the number of teachers and teacher wage; the product 
             of the number of assistants and assistant wage along with the product of the number of hours the class/event 
             is over and the hourly venue hire cost."""
@@ -2302,9 +2430,8 @@ class FinanceCalculator(tk.Frame):
             outgoingsFormatted = "£" + str(outgoings.quantize(Decimal('0.01'), rounding="ROUND_UP"))
             # Get the number of students required by a negative floor division (thus ceiling) of the outgoings by the class/event cost
             requiredNo = int(-(-float(outgoings)//float(cost)))
-            """Get the number of students in the class by finding the number of Student(Class/Event) relationships 
-            that exist in the database involving the event/class matching ID."""
-            noStudents = len(self.__handler.getForeigns(("Student" + theKey), ID))
+            # Get the number of students in the class/event matching ID
+            noStudents = counts["Student"]
             # Find the income of the class/event by the product of the number of students and class cost
             income = noStudents * Decimal(cost)
             # Display all of the data that has been calculated
@@ -2342,7 +2469,12 @@ class Home(tk.Frame):
         tk.Frame.__init__(self, container)
         self.__handler = master.getEntityHandler()
         self.__searcher = entityHandler.Searcher(self.__handler)
-        self.__labels = []
+        # Dictionaries with the IDs of the classes and events shown as keys and the labels showing them as values
+        self.__shown = {"Class": {}, "Event": {}}
+        # True once the Home screen has been populated (see set)
+        self.__populated = False
+        # Updating the Home screen when a class, event or venue is changed
+        self.__handler.subscribe(self.__onChange, ["Class", "Event", "Venue", "VenueClass", "VenueEvent"])
         # Creating the GUI elements
         title = tk.Label(self, font=('Arial', 24, 'bold'), text="Dance Admin System")
         title.grid(row=0, padx=10, pady=(10, 0), columnspan=2)
@@ -2352,47 +2484,88 @@ class Home(tk.Frame):
         todayLabel.grid(row=3, column=0, padx=10, sticky='w')
         eventLabel = tk.Label(self, text="Upcoming Events", font=('TkDefaultFont', 13, 'bold'))
         eventLabel.grid(row=3, column=1, padx=10, sticky='w')
-        # Resetting the Home screen and then populating it with data
+        # Resetting the Home screen. It is populated with data (by set) once the user has logged in.
         self.__reset()
-        self.set()
 
     def set(self):
         """This function gets the classes that take place on the current data and event that takes place in the current
         month and displays them on the home screen using labels."""
-        classList = self.__handler.todayClasses()  # Getting the classes on the current day and storing their IDs in a list
+        self.__populated = True
+        self.__showColumn("Class", self.__handler.todayClasses())  # Getting the IDs of the classes on the current day
+        self.__showColumn("Event", self.__handler.monthEvents())  # Getting the IDs of the events in the current month
+
+    def __showColumn(self, entityType, IDList):
+        """This function takes "Class" or "Event" and a list of IDs of that type. It removes the labels in the column of
+        that type and displays a label for each ID in the list in their place."""
+        for label in self.__shown[entityType].values():
+            label.grid_remove()
+        self.__shown[entityType] = {}
+        # Classes are shown in the first column and events in the second
+        column = 0 if entityType == "Class" else 1
         _row = 10
-        for aclass in classList:
-            # Getting the data values for aclass by calling getData and passing it the ID 'aclass'
-            values = self.__handler.getData("Class", aclass)
-            # Using the foreign key for the Venue of aclass and finding the Venue Class relationship that involves it
-            venueID = self.__handler.getForeigns("VenueClass", aclass)[0][1]
-            # Finding the name of the Venue by passing getData its ID
-            venue = self.__handler.getData("Venue", venueID)[0]
-            # Displaying the name of the class, the venue and date of the class
-            string = (values[0] + " | " + venue + " | " + values[1])
-            label = tk.Label(self, text=string)
-            label.grid(column=0, row=_row, padx=10, sticky='w')
-            # Keep a track of the label by appending it to a list
-            self.__labels.append(label)
+        for ID in IDList:
+            label = tk.Label(self, text=self.__labelText(entityType, ID))
+            label.grid(column=column, row=_row, padx=10, sticky='w')
+            # Keep a track of the label by storing it with the ID it shows
+            self.__shown[entityType][ID] = label
             _row += 1
-        _row = 10
-        eventList = self.__handler.monthEvents()  # Getting the event in the current month and storing their IDs in a list
-        for event in eventList:
-            # Getting the data values for event by calling getData and passing it the ID 'event'
-            values = self.__handler.getData("Event", event)
-            venueID = self.__handler.getForeigns("VenueEvent", event)[0][1]
+
+    def __labelText(self, entityType, ID):
+        """This function takes "Class" or "Event" and an ID and returns the text of the label showing that record - the
+        name of the class or event, the venue and the time of the class or the start date of the event"""
+        # Getting the data values for the record by calling getData and passing it the ID
+        values = self.__handler.getData(entityType, ID)
+        # Finding the ID of the Venue the record takes place in and then the name of the Venue by passing getData its ID
+        venueID = self.__handler.getVenue(entityType, ID)
+        # A class or event is only linked to its venue after it has been saved, so it may not have one yet
+        venue = ""
+        if venueID is not None:
             venue = self.__handler.getData("Venue", venueID)[0]
-            string = (values[0] + " | " + venue + " | " + str(values[6]))
-            label = tk.Label(self, text=string)
-            label.grid(column=1, row=_row, padx=10, sticky='w')
-            self.__labels.append(label)
-            _row += 1
+        if entityType == "Class":
+            return values[0] + " | " + venue + " | " + values[1]
+        return values[0] + " | " + venue + " | " + str(values[6])
+
+    def __onChange(self, event):
+        """This function is called by the entityHandler with a list describing a change to a class, event or venue (see
+        entityHandler.subscribe). Only the labels showing the records affected by the change are updated. A column is
+        only laid out again if a class or event has been added to it, removed from it or moved within it, which is found
+        using the entityHandler's calendar index rather than looking at every class and event."""
+        # A reload is made by the thread saving the database, which must not change the GUI
+        if not self.__populated or event[0] == "reloaded":
+            return
+        if event[1] in self.__shown:
+            # A class or event has been changed, so finding the list that should now be shown in its column
+            if event[1] == "Class":
+                IDList = self.__handler.todayClasses()
+            else:
+                IDList = self.__handler.monthEvents()
+            if IDList != list(self.__shown[event[1]]):
+                self.__showColumn(event[1], IDList)
+            elif event[2] in self.__shown[event[1]]:
+                self.__shown[event[1]][event[2]].config(text=self.__labelText(event[1], event[2]))
+        elif event[1] == "Venue":
+            # A deleted venue is unlinked from its classes and events, which updates their labels (see below)
+            if event[0] == "updated":
+                for entityType in self.__shown:
+                    for ID in self.__shown[entityType]:
+                        if self.__handler.getVenue(entityType, ID) == event[2]:
+                            self.__shown[entityType][ID].config(text=self.__labelText(entityType, ID))
+        else:
+            # A class or event has been linked to or unlinked from a venue, so the label of that class or event is updated
+            entityType = event[1][len("Venue"):]
+            for ID in event[3:]:
+                if ID in self.__shown[entityType]:
+                    try:
+                        self.__shown[entityType][ID].config(text=self.__labelText(entityType, ID))
+                    except KeyError:
+                        # A deleted class or event is unlinked from its venue before the event for the deletion (which
+                        # removes its label) is passed on, so it can still be shown here
+                        pass
 
     def __reset(self):
         """This function clears the Home screen of any classes or event (i.e. it resets it to its default values)"""
-        for label in self.__labels:
-            label.grid_remove()
-        self.__labels = []
+        for entityType in self.__shown:
+            self.__showColumn(entityType, [])
 
     def windowTitle(self):
         return "Home"
@@ -2435,8 +2608,9 @@ class Login(tk.Toplevel):
 
     def __close(self):
         """This function closes the current window by destroying the Login object and makes the main master window
-        visible again"""
+        visible again with the Home page filled in"""
         self.__master.deiconify()
+        self.__master.loadHome()
         self.destroy()
 
     def __login(self):
@@ -2483,7 +2657,7 @@ class AccountsPage(tk.Frame):
                                                                             self.__master.createCurrentPage()])
         addButton.grid(row=2, column=0, padx=10, pady=10)
         viewButton = tk.Button(self, text="View Account", command=lambda: [self.__master.showPage("UserAccountList"),
-                                                                           self.__master.getCurrentPage().getCurrent()])
+                                                                           self.__master.getCurrentPage().refresh()])
         viewButton.grid(row=2, column=1, padx=10, pady=10)
         title = tk.Label(self, font=('Arial', 24, 'bold'), text="Accounts")
         title.grid(row=0, padx=10, pady=(10, 0), columnspan=3)
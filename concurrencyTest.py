@@ -0,0 +1,180 @@
+import entityHandler
+import storageBackends
+import dataExport
+import datetime
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+
+class ConcurrencyTest(object):
+    """This class is a stress test of the EntityHandler being used by several threads at once. Reader threads search,
+    query, count the students in a class, take snapshots and export while a writer thread creates, changes (in
+    batches, some of which are undone) and deletes records, and the database is autosaved. It checks that no thread
+    raises an exception, that every snapshot is consistent (no relationship in it refers to a student which is not in
+    it) and that the saved database matches the records in memory once the threads have finished.
+
+    It is run for both storage backends with "python concurrencyTest.py" and prints whether each passed."""
+    def __init__(self, backendName, writes=100, readers=4):
+        """The constructor takes the name of the backend to test ("pickle" or "sqlite"), the number of times the writer
+        thread changes the database and the number of each kind of reader thread"""
+        self.__backendName = backendName
+        self.__writes = writes
+        self.__readers = readers
+        self.__directory = tempfile.mkdtemp()
+        self.__handler = None
+        self.__classID = None
+        self.__studentIDs = []
+        # The list of the tracebacks of any exceptions raised by the threads
+        self.__errors = []
+        # A dictionary with the names of the kinds of reader as keys and the number of times they have read as values
+        self.__reads = {}
+        self.__readsLock = threading.Lock()
+        self.__stop = threading.Event()
+
+    def run(self):
+        """This function runs the test and returns True if it passed and False if not. The files it creates are deleted
+        afterwards."""
+        try:
+            self.__handler = entityHandler.EntityHandler(self.__newBackend())
+            self.__handler.startAutosave(0.05)
+            self.__createRecords()
+            threads = []
+            for reader in [self.__search, self.__query, self.__countLinks, self.__snapshot, self.__export]:
+                for i in range(0, self.__readers):
+                    threads.append(threading.Thread(target=self.__read, args=(reader,)))
+            writer = threading.Thread(target=self.__write)
+            for thread in threads:
+                thread.start()
+            writer.start()
+            writer.join()
+            self.__stop.set()
+            for thread in threads:
+                thread.join()
+            self.__checkSaved()
+        finally:
+            self.__stop.set()
+            shutil.rmtree(self.__directory, ignore_errors=True)
+        for error in self.__errors:
+            print(error)
+        passed = len(self.__errors) == 0
+        print(self.__backendName + ": " + ("passed" if passed else "FAILED") + " " + str(self.__reads))
+        return passed
+
+    def __newBackend(self):
+        """This function returns a new instance of the backend being tested, using the files in the test's directory"""
+        if self.__backendName == "sqlite":
+            return storageBackends.SqliteBackend(os.path.join(self.__directory, "entities.db"))
+        return storageBackends.PickleBackend(os.path.join(self.__directory, "entityData"))
+
+    def __studentData(self, name, number):
+        """This function takes a first name and a number and returns the data for a Student record"""
+        return [name, "Smith" + str(number % 7), datetime.date(2010, 1, 1), name.lower() + str(number) + "@mail.com",
+                "0700" + str(number), "AB1 2CD", "1", ""]
+
+    def __createRecords(self):
+        """This function creates a class and the students that the writer thread changes"""
+        self.__classID = self.__handler.updateRecord("Class", None, ["Ballet", "10:00", "11:00", "5", "1", "1",
+                                                                    "Monday"])
+        for i in range(0, 200):
+            self.__studentIDs.append(self.__handler.updateRecord("Student", None, self.__studentData("Anne", i)))
+
+    def __write(self):
+        """This function is run by the writer thread. Each time it creates a student, adds it to the class and changes
+        another student in a batch, undoes every fifth batch and deletes every other student it created."""
+        choices = random.Random(1)
+        try:
+            for i in range(0, self.__writes):
+                ID = self.__handler.updateRecord("Student", None, self.__studentData("Bob", i))
+                try:
+                    with self.__handler.batch():
+                        self.__handler.createRelationship("StudentClass", self.__classID, ID)
+                        self.__handler.updateRecord("Student", choices.choice(self.__studentIDs),
+                                                    self.__studentData("Chloe", i))
+                        if i % 5 == 0:
+                            raise RuntimeError("undo")
+                except RuntimeError:
+                    pass
+                if i % 2 == 1:
+                    self.__handler.deleteRecord("Student", ID)
+                # Waiting a moment so the readers (which wait for any waiting writer) read between the changes
+                time.sleep(0.001)
+        except Exception:
+            self.__errors.append(traceback.format_exc())
+
+    def __read(self, reader):
+        """This function is run by each reader thread. It takes a function and calls it until the writer has finished."""
+        count = 0
+        try:
+            while not self.__stop.is_set():
+                reader()
+                count += 1
+                # Waiting a moment so that the writer (which waits for every reader) is not held up for long
+                time.sleep(0.001)
+        except Exception:
+            self.__errors.append(traceback.format_exc())
+        with self.__readsLock:
+            # The name of the private function without the name of the class (e.g. search)
+            name = reader.__name__.split("__")[-1]
+            self.__reads[name] = self.__reads.get(name, 0) + count
+
+    def __search(self):
+        """This function searches for students and gets the view string of some of those found"""
+        searcher = entityHandler.Searcher(self.__handler)
+        for ID in searcher.search("smith3", ["Student"])["Student"][:10]:
+            try:
+                searcher.getView("Student", ID)
+            except KeyError:
+                # The student has been deleted since the search
+                pass
+
+    def __query(self):
+        """This function queries the students with one last name, sorted by first name"""
+        list(self.__handler.query("Student", {"lastName": "Smith2"}, orderBy="firstName"))
+
+    def __countLinks(self):
+        """This function counts the people in the class and gets the students linked to it"""
+        self.__handler.getLinkCounts("Class", self.__classID)
+        self.__handler.getForeigns("StudentClass", self.__classID)
+
+    def __snapshot(self):
+        """This function takes a snapshot (inside reading, which must be allowed) and checks it is consistent"""
+        with self.__handler.reading():
+            snapshot = self.__handler.snapshot(["Student", "StudentClass"])
+        for ID in snapshot["StudentClass"]:
+            if snapshot["StudentClass"][ID].getIDs()[0] not in snapshot["Student"]:
+                raise AssertionError("The snapshot has a relationship to a student which is not in it")
+
+    def __export(self):
+        """This function exports the students along with the classes they are in"""
+        exporter = dataExport.DataExporter(self.__handler)
+        # Each thread exports to its own file, so two threads never write the same file at once
+        filename = os.path.join(self.__directory, threading.current_thread().name + ".csv")
+        exporter.exportLinked(filename, "Student", "StudentClass", "Class")
+
+    def __checkSaved(self):
+        """This function closes the handler (saving any changes) and checks that the database it saved contains the
+        same students and relationships as the handler did"""
+        entities = self.__handler.getEntities()
+        students = sorted(entities["Student"].keys())
+        relationships = sorted(entities["StudentClass"].keys())
+        self.__handler.close()
+        saved = entityHandler.EntityHandler(self.__newBackend())
+        if sorted(saved.getEntities()["Student"].keys()) != students:
+            self.__errors.append("The saved students do not match the students in memory")
+        if sorted(saved.getEntities()["StudentClass"].keys()) != relationships:
+            self.__errors.append("The saved relationships do not match the relationships in memory")
+        saved.close()
+
+
+if __name__ == "__main__":
+    results = []
+    for backendName in ["pickle", "sqlite"]:
+        results.append(ConcurrencyTest(backendName).run())
+    if False in results:
+        sys.exit(1)
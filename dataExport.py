@@ -0,0 +1,146 @@
+import entities
+import datetime
+import csv
+import json
+import os
+
+
+class DataExporter(object):
+    """This class exports the records in the database to CSV or JSONL files (e.g. for reports or backups). The rows are
+    produced by generators one record at a time and written to the file as they are produced, so the records are never
+    copied into a list and exporting a large database uses very little extra memory. The database is not locked while
+    exporting, so the rest of the software can still be used - a record deleted part way through is simply left out.
+    Each record is only read inside the entityHandler's reading, so the exporter can be run by another thread."""
+    def __init__(self, handler):
+        """The constructor takes the entityHandler as its input"""
+        self.__handler = handler
+
+    def rows(self, entityType):
+        """This function takes an entity type and yields a dictionary for each record of that type, containing its ID
+        and the value of each of its fields"""
+        fields = getattr(entities, entityType).fields
+        for values in self.__handler.query(entityType):
+            row = {"ID": values[0]}
+            for i in range(0, len(fields)):
+                row[fields[i]] = values[i + 1]
+            yield row
+
+    def linkedRows(self, entityType, relationship, linkedType):
+        """This function takes an entity type, a relationship involving that type and the other type in the relationship
+        (e.g. Student, StudentClass and Class). It yields the same rows as the rows function with an extra value - the
+        list of the names of the linked records (e.g. the classes each student is in)."""
+        with self.__handler.reading():
+            linkedTable = self.__handler.getEntities()[linkedType]
+        links = self.__links(entityType, relationship)
+        for row in self.rows(entityType):
+            names = []
+            for ID in links.get(row["ID"], []):
+                values = self.__values(linkedTable, ID)
+                if values is not None:
+                    names.append(values[0])
+            row[linkedType] = names
+            yield row
+
+    def __links(self, entityType, relationship):
+        """This function takes an entity type and a relationship involving it and returns a dictionary with the IDs of
+        the records of that type as keys and lists of the IDs of the records they are linked to as values. The
+        relationships are only looked through once, rather than once for every record, and only IDs are stored."""
+        links = {}
+        with self.__handler.reading():
+            table = self.__handler.getEntities()[relationship]
+        """A relationship's row is [parentID, childID] and its name is the child type followed by the parent type (e.g. 
+        StudentClass), so if the name starts with entityType then the records of that type are the children"""
+        if relationship.startswith(entityType):
+            position = 1
+        else:
+            position = 0
+        for ID in self.__IDs(table):
+            values = self.__values(table, ID)
+            if values is not None:
+                links.setdefault(values[position], []).append(values[1 - position])
+        return links
+
+    def exportFile(self, filename, entityType):
+        """This function takes a filename and an entity type and writes every record of that type to the file. The file
+        is written as JSONL if its name ends in .jsonl and as CSV otherwise. It returns the number of records written."""
+        fields = ["ID"] + getattr(entities, entityType).fields
+        return self.writeFile(filename, fields, self.rows(entityType))
+
+    def exportLinked(self, filename, entityType, relationship, linkedType):
+        """This function takes a filename and the same inputs as linkedRows and writes the rows to the file (e.g. a list
+        of students with their classes). It returns the number of records written."""
+        fields = ["ID"] + getattr(entities, entityType).fields + [linkedType]
+        return self.writeFile(filename, fields, self.linkedRows(entityType, relationship, linkedType))
+
+    def exportAll(self, directory, extension=".csv"):
+        """This function takes the name of a directory and a file extension (.csv or .jsonl) and writes every entity type
+        to its own file in the directory (e.g. Student.csv). It returns a dictionary of the number of records written
+        for each type."""
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        counts = {}
+        for entityType in self.__handler.getEntities().keys():
+            counts[entityType] = self.exportFile(os.path.join(directory, entityType + extension), entityType)
+        return counts
+
+    def writeFile(self, filename, fields, rows):
+        """This function takes a filename, the list of field names to write and an iterable of rows (dictionaries). Each
+        row is written to the file as soon as it is produced. It returns the number of rows written."""
+        count = 0
+        # Writing to a temporary file first, so a reader never sees a half-written export
+        tempName = filename + ".tmp"
+        file = open(tempName, 'w', newline='', encoding='utf-8')
+        try:
+            if filename.lower().endswith(".jsonl"):
+                for row in rows:
+                    file.write(json.dumps(self.__convertRow(row, False)) + "\n")
+                    count += 1
+            else:
+                writer = csv.DictWriter(file, fieldnames=fields)
+                writer.writeheader()
+                for row in rows:
+                    writer.writerow(self.__convertRow(row, True))
+                    count += 1
+        finally:
+            file.close()
+        os.replace(tempName, filename)
+        return count
+
+    def __IDs(self, table):
+        """This function takes a dictionary of records and returns a copy of its IDs (but not the records), so records
+        can be added or deleted by the rest of the software while the export runs"""
+        with self.__handler.reading():
+            return list(table.keys())
+
+    def __values(self, table, ID):
+        """This function takes a dictionary of records and an ID and returns the values of the matching record in the
+        same order as its fields, or None if it has been deleted"""
+        with self.__handler.reading():
+            try:
+                # Copying the values, as the record may be changed once the lock is released
+                return list(table[ID].exportRow())
+            except KeyError:
+                return None
+
+    def __convertRow(self, row, flat):
+        """This function takes a row and whether it is for a CSV file (flat) and returns a copy of it with each value
+        converted to something that can be written to the file. Dates are written in ISO format, bytes (e.g. a password
+        hash) as hexadecimal and, in a CSV file, lists as their items separated by ';'."""
+        output = {}
+        for key in row:
+            value = row[key]
+            if isinstance(value, (datetime.date, datetime.time)):
+                value = value.isoformat()
+            elif isinstance(value, bytes):
+                value = value.hex()
+            elif isinstance(value, (list, tuple)):
+                items = []
+                for item in value:
+                    if isinstance(item, (datetime.date, datetime.time)):
+                        item = item.isoformat()
+                    items.append(item)
+                value = items
+                if flat:
+                    value = ";".join(str(item) for item in items)
+            output[key] = value
+        return output
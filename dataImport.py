@@ -0,0 +1,182 @@
+import validator
+import datetime
+import csv
+import json
+
+
+class BulkImporter(object):
+    """This class imports many Student, Teacher or Assistant records at once from a CSV or JSONL file (e.g. at the start
+    of a new term), rather than each one being typed into a form. The file is read one row at a time and the rows are
+    validated and added to the database in batches, so even a very large file never has to be held in memory.
+
+    Each row has a value for each of the fields of a person - firstName, lastName, DoB, email, contactNumber, postcode,
+    houseNumber and medical. A CSV file gives the field names in its first line and a JSONL file has one JSON object
+    per line. A row may also have 'classes' and 'events' - the names or IDs of the classes and events the person should
+    be added to (separated by ';' in a CSV file, or as a list in a JSONL file)."""
+    fields = ["firstName", "lastName", "DoB", "email", "contactNumber", "postcode", "houseNumber", "medical"]
+
+    def __init__(self, handler, batchSize=5000):
+        """The constructor takes the entityHandler and the number of rows to add to the database at a time as its
+        inputs"""
+        self.__handler = handler
+        self.__batchSize = batchSize
+        # The list of errors found in the last import, each one is a list of [row number, field, error message]
+        self.__errors = []
+        """Dictionaries with the names (in lowercase) and IDs of every Class and Event as keys and their IDs as values, 
+        used to find the records named in the 'classes' and 'events' columns. These are created when an import starts."""
+        self.__classes = {}
+        self.__events = {}
+
+    def importFile(self, filename, entityType):
+        """This function takes the name of a CSV or JSONL file and the type of person to create (Student, Teacher or
+        Assistant) as its inputs. It adds every valid row of the file to the database and returns the number of records
+        created. Invalid rows are not added - their errors can be found with getErrors."""
+        self.__errors = []
+        self.__classes = self.__findNames("Class")
+        self.__events = self.__findNames("Event")
+        count = 0
+        batch = []
+        for rowNumber, row in self.__readRows(filename):
+            record = self.__validateRow(rowNumber, row)
+            if record is not None:
+                batch.append(record)
+            # Once the batch is full it is added to the database in one go
+            if len(batch) == self.__batchSize:
+                count += self.__addBatch(entityType, batch)
+                batch = []
+        if len(batch) > 0:
+            count += self.__addBatch(entityType, batch)
+        return count
+
+    def getErrors(self):
+        """This function returns the list of errors found in the last import. Each error is a list of the row number in
+        the file, the field which is invalid and the error message."""
+        return self.__errors
+
+    def writeReport(self, filename):
+        """This function takes a filename and writes the errors found in the last import to it as a CSV file"""
+        file = open(filename, 'w', newline='')
+        writer = csv.writer(file)
+        writer.writerow(["Row", "Field", "Error"])
+        writer.writerows(self.__errors)
+        file.close()
+
+    def __readRows(self, filename):
+        """This function takes the name of a CSV or JSONL file and yields the row number and a dictionary of the values
+        of each row in turn. The row number is the line of the file the row is on."""
+        file = open(filename, newline='', encoding='utf-8-sig')
+        try:
+            if filename.lower().endswith(".jsonl"):
+                rowNumber = 0
+                for line in file:
+                    rowNumber += 1
+                    # Blank lines (e.g. at the end of the file) are skipped
+                    if line.strip() == "":
+                        continue
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        self.__errors.append([rowNumber, "", "This is not valid JSON"])
+                        continue
+                    if not isinstance(row, dict):
+                        self.__errors.append([rowNumber, "", "This is not a JSON object"])
+                        continue
+                    yield rowNumber, row
+            else:
+                reader = csv.DictReader(file)
+                for row in reader:
+                    # The first line of the file is the field names, so the first row is on line 2
+                    yield reader.line_num, row
+        finally:
+            file.close()
+
+    def __validateRow(self, rowNumber, row):
+        """This function takes a row number and a dictionary of the values in a row. It checks each value with the same
+        validation as the PersonForm and returns a list of the data for the record and the IDs of the classes and events
+        to add it to. If any value is invalid the errors are recorded and None is returned."""
+        data = []
+        for field in self.fields:
+            value = row.get(field)
+            if value is None:
+                value = ""
+            data.append(str(value).strip())
+        errors = [validator.validateName(data[0]), validator.validateName(data[1]), "", validator.validateEmail(data[3]),
+                  validator.validateContactNumber(data[4]), validator.validatePostcode(data[5]),
+                  validator.validateHouseNumber(data[6]), validator.validateMedicalDetails(data[7])]
+        # The date of birth is stored as a date object, as it is when chosen in the form
+        data[2] = self.__parseDate(data[2])
+        if data[2] is None:
+            errors[2] = "This is not a valid date"
+        classes, classErrors = self.__findLinks(row.get("classes"), self.__classes, "class")
+        events, eventErrors = self.__findLinks(row.get("events"), self.__events, "event")
+        valid = True
+        for i in range(0, len(errors)):
+            if errors[i] != "":
+                self.__errors.append([rowNumber, self.fields[i], errors[i]])
+                valid = False
+        for error in classErrors:
+            self.__errors.append([rowNumber, "classes", error])
+            valid = False
+        for error in eventErrors:
+            self.__errors.append([rowNumber, "events", error])
+            valid = False
+        if valid:
+            return [data, classes, events]
+        return None
+
+    def __parseDate(self, string):
+        """This function takes a string and returns it as a date object, or None if it is not a date. Dates can be
+        written as YYYY-MM-DD or DD/MM/YYYY."""
+        # fromisoformat is much faster than strptime, which matters when there are thousands of rows
+        try:
+            return datetime.date.fromisoformat(string)
+        except ValueError:
+            pass
+        try:
+            return datetime.datetime.strptime(string, "%d/%m/%Y").date()
+        except ValueError:
+            return None
+
+    def __findLinks(self, value, names, recordName):
+        """This function takes the value of a 'classes' or 'events' column, the dictionary of names of that type and the
+        name of the type. It returns a list of the IDs of the records named and a list of error messages for any name
+        that does not match a record."""
+        IDs = []
+        errors = []
+        if value is None or value == "":
+            return IDs, errors
+        if isinstance(value, str):
+            value = value.split(";")
+        for name in value:
+            name = str(name).strip()
+            if name == "":
+                continue
+            if name.lower() in names:
+                if names[name.lower()] not in IDs:
+                    IDs.append(names[name.lower()])
+            else:
+                errors.append("There is no " + recordName + " called " + name)
+        return IDs, errors
+
+    def __findNames(self, entityType):
+        """This function takes an entity type (Class or Event) and returns a dictionary with the name (in lowercase) and
+        ID of each record of that type as keys and the IDs as values"""
+        names = {}
+        # The records are read inside reading so that another thread can not change them part of the way through
+        with self.__handler.reading():
+            table = self.__handler.getEntities()[entityType]
+            for ID in table:
+                names[table[ID].getView()[0].lower()] = ID
+                names[str(ID).lower()] = ID
+        return names
+
+    def __addBatch(self, entityType, batch):
+        """This function takes the type of person and a list of validated rows and adds them, along with their links to
+        classes and events, to the database in one call. It returns the number of records added."""
+        records = []
+        links = []
+        for data, classes, events in batch:
+            records.append(data)
+            links.append([[entityType + "Class", classes], [entityType + "Event", events]])
+        self.__handler.importRecords(entityType, records, links)
+        return len(records)
@@ -1,6 +1,11 @@
 class Person(object):
     """This is an object in my database to store any record that is a person type. This has child classes Student,
     Teacher and Assistant"""
+    # The names of the attributes of a person in the order they are passed to update. These are used by storage backends.
+    fields = ["firstName", "lastName", "DoB", "email", "contactNumber", "postcode", "houseNumber", "medical"]
+    # The attributes which are the IDs of other records (a person has none)
+    foreignKeys = []
+
     def __init__(self):
         """This constructor creates all of the private variables (attributes) of this object and sets their value to
         None"""
@@ -42,6 +47,16 @@ class Person(object):
         """This function returns the email address of the person"""
         return self.__email
 
+    def exportRow(self):
+        """This function returns the values of all the attributes of the object as a list in the same order as fields.
+        It is used when storing the object."""
+        return self.returnValues()
+
+    def importRow(self, row):
+        """This function takes a list of values in the same order as fields and sets the attributes of the object to
+        them. It is used when loading the object."""
+        self.update(row)
+
 
 class Student(Person):
     """This Student class is a child of a Person class. It has the same data values and is one child of person that can
@@ -67,6 +82,9 @@ class Teacher(Person):
 class Venue(object):
     """This is an object in my database. The Venue is used to store data about a location in which events/classes can
     be held"""
+    fields = ["name", "contactName", "contactNumber", "email", "addressLine1", "addressLine2", "postcode", "hourlyCost"]
+    foreignKeys = []
+
     def __init__(self):
         self.__name = self.__postcode = self.__contactName = self.__email = self.__contactNumber = self.__hourlyCost \
             = self.__addressLine1 = self.__addressLine2 = None
@@ -95,6 +113,12 @@ class Venue(object):
         return [self.__name, self.__contactName, self.__contactNumber, self.__email, self.__addressLine1,
                 self.__addressLine2, self.__postcode, self.__hourlyCost]
 
+    def exportRow(self):
+        return self.returnValues()
+
+    def importRow(self, row):
+        self.update(row)
+
 
 class anEvent(object):
     """This is an object in my database to store any record that is of anEvent type. This has child classes Event and
@@ -123,9 +147,20 @@ class anEvent(object):
         a child."""
         return [self.__name, self.__sTime, self.__eTime, self.__cost, self.__teacherWage, self.__assistantWage]
 
+    def exportRow(self):
+        """This function returns the values of all the attributes of the object (including those of the child class) as
+        a list in the same order as the child's fields"""
+        return self.returnValues()
+
+    def importRow(self, row):
+        self.update(row)
+
 
 class Event(anEvent):
     """This Event class is a child of anEvent class. This is used to store data about an Event that is being held."""
+    fields = ["name", "sTime", "eTime", "cost", "teacherWage", "assistantWage", "sDate", "eDate"]
+    foreignKeys = []
+
     def __init__(self):
         """This constructor initialises the parent class. It creates all the necessary attributes of this child class
         and sets their value to None."""
@@ -155,6 +190,9 @@ class Event(anEvent):
 
 
 class Class(Event):
+    fields = ["name", "sTime", "eTime", "cost", "teacherWage", "assistantWage", "day"]
+    foreignKeys = []
+
     def __init__(self):
         anEvent.__init__(self)
         self.__day = None
@@ -177,6 +215,9 @@ class Class(Event):
 class UniformType(object):
     """This is an object in my database. The UniformType is used to store data about different uniform items that can be
     ordered"""
+    fields = ["name", "colours", "sizes", "cost"]
+    foreignKeys = []
+
     def __init__(self):
         self.__name = self.__colours = self.__sizes = self.__cost = None
 
@@ -195,10 +236,19 @@ class UniformType(object):
     def getSearch(self):
         return [self.__name]
 
+    def exportRow(self):
+        return self.returnValues()
+
+    def importRow(self, row):
+        self.update(row)
+
 
 class UniformOrder(object):
     """This is an object in my database. The UniformOrder is used to store data about an order for uniform that has been
     made"""
+    fields = ["studentID", "date", "totalCost"]
+    foreignKeys = ["studentID"]
+
     def __init__(self):
         self.__studentID = self.__date = self.__totalCost = None
 
@@ -216,11 +266,20 @@ class UniformOrder(object):
         self.__date = data[1]
         self.__totalCost = data[2]
 
+    def exportRow(self):
+        return self.returnValues()
+
+    def importRow(self, row):
+        self.update(row)
+
 
 class UniformOrderLine(object):
     """This is an object in my database necessary to avoid many-to-many relationships. The UniformOrderLine links an
     order to a specific item (including its quantity and attribute choices). It contains foreign keys relating to a
     UniformType object (uniformID) and a UniformOrder object (orderID)"""
+    fields = ["orderID", "uniformID", "quantity", "size", "colour", "cost"]
+    foreignKeys = ["orderID", "uniformID"]
+
     def __init__(self):
         self.__orderID = self.__uniformID = self.__quantity = self.__size = self.__colour = self.__cost = None
 
@@ -239,10 +298,19 @@ class UniformOrderLine(object):
         """This function returns the foreign key of orderID"""
         return self.__orderID
 
+    def exportRow(self):
+        return self.returnValues()
+
+    def importRow(self, row):
+        self.update(row)
+
 
 class Note(object):
     """This is an object in my database. The Note is used to store data for a note that has been written about a
     person (this could be a reminder, behavioural records etc."""
+    fields = ["title", "note", "dateCreated", "dateEdited", "recordID"]
+    foreignKeys = ["recordID"]
+
     def __init__(self):
         self.__title = self.__note = self.__dateCreated = self.__dateEdited = self.__recordID = None
 
@@ -260,11 +328,36 @@ class Note(object):
         """This function returns the foreign IDs of the object. In this case it is recordID"""
         return self.__recordID
 
+    def exportRow(self):
+        """This function returns the values of all the attributes of the note. Unlike returnValues, this includes the
+        recordID foreign key."""
+        return [self.__title, self.__note, self.__dateCreated, self.__dateEdited, self.__recordID]
+
+    def importRow(self, row):
+        self.update(row)
+
+
+class Relationship(object):
+    """This is the parent class of all the objects in my database which link two other records together (e.g.
+    StudentClass). Each child class stores two foreign keys - the ID of the parent record (e.g. a class) and the ID of
+    the other record (e.g. a student)."""
+    def exportRow(self):
+        """This function returns the foreign keys of the relationship as a list of the parent ID followed by the other
+        ID, which is the order they are passed to update"""
+        IDs = self.getIDs()
+        return [IDs[1], IDs[0]]
 
-class AssistantEvent(object):
+    def importRow(self, row):
+        self.update(row[0], row[1])
+
+
+class AssistantEvent(Relationship):
     """This is an object in my database necessary to avoid many-to-many relationships. The AssistantEvent shows the
     relationship of an assistant attending an event. It contains foreign keys relating to an Assistant object
     (assistantID) and an Event object (eventID)"""
+    fields = ["eventID", "assistantID"]
+    foreignKeys = ["eventID", "assistantID"]
+
     def __init__(self):
         self.__assistantID = None
         self.__eventID = None
@@ -280,10 +373,13 @@ class AssistantEvent(object):
         return [self.__assistantID, self.__eventID]
 
 
-class AssistantClass(object):
+class AssistantClass(Relationship):
     """This is an object in my database necessary to avoid many-to-many relationships. The AssistantClass shows the
     relationship of an assistant attending a class. It contains foreign keys relating to an Assistant object
     (assistantID) and a Class object (classID)"""
+    fields = ["classID", "assistantID"]
+    foreignKeys = ["classID", "assistantID"]
+
     def __init__(self):
         self.__assistantID = None
         self.__classID = None
@@ -297,7 +393,10 @@ class AssistantClass(object):
 
 
 # The following very similar relationship objects should be self explanatory based upon the comments above
-class StudentEvent(object):
+class StudentEvent(Relationship):
+    fields = ["eventID", "studentID"]
+    foreignKeys = ["eventID", "studentID"]
+
     def __init__(self):
         self.__studentID = None
         self.__eventID = None
@@ -310,7 +409,10 @@ class StudentEvent(object):
         return [self.__studentID, self.__eventID]
 
 
-class StudentClass(object):
+class StudentClass(Relationship):
+    fields = ["classID", "studentID"]
+    foreignKeys = ["classID", "studentID"]
+
     def __init__(self):
         self.__studentID = None
         self.__classID = None
@@ -323,7 +425,10 @@ class StudentClass(object):
         return [self.__studentID, self.__classID]
 
 
-class TeacherEvent(object):
+class TeacherEvent(Relationship):
+    fields = ["eventID", "teacherID"]
+    foreignKeys = ["eventID", "teacherID"]
+
     def __init__(self):
         self.__teacherID = None
         self.__eventID = None
@@ -336,7 +441,10 @@ class TeacherEvent(object):
         return [self.__teacherID, self.__eventID]
 
 
-class TeacherClass(object):
+class TeacherClass(Relationship):
+    fields = ["classID", "teacherID"]
+    foreignKeys = ["classID", "teacherID"]
+
     def __init__(self):
         self.__teacherID = None
         self.__classID = None
@@ -349,7 +457,10 @@ class TeacherClass(object):
         return [self.__teacherID, self.__classID]
 
 
-class VenueClass(object):
+class VenueClass(Relationship):
+    fields = ["classID", "venueID"]
+    foreignKeys = ["classID", "venueID"]
+
     def __init__(self):
         self.__venueID = None
         self.__classID = None
@@ -362,7 +473,10 @@ class VenueClass(object):
         return [self.__venueID, self.__classID]
 
 
-class VenueEvent(object):
+class VenueEvent(Relationship):
+    fields = ["eventID", "venueID"]
+    foreignKeys = ["eventID", "venueID"]
+
     def __init__(self):
         self.__venueID = None
         self.__eventID = None
@@ -378,6 +492,9 @@ class VenueEvent(object):
 class User(object):
     """This is an object in my database. The User is used to store data for a user of the software - this is a password,
     email and admin status. The username of this object is its primary ID (which is handled elsewhere)."""
+    fields = ["password", "email", "admin"]
+    foreignKeys = []
+
     def __init__(self):
         """This constructor creates the private attributes of the object and sets their values to empty strings"""
         self.__password = self.__email = self.__admin = ""
@@ -398,3 +515,9 @@ class User(object):
 
     def returnValues(self):
         return [self.__password, self.__email, self.__admin]
+
+    def exportRow(self):
+        return self.returnValues()
+
+    def importRow(self, row):
+        self.update(row)
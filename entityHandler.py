@@ -1,201 +1,1440 @@
-import fileManagement
+import storageBackends
 import entities
+import indexes
 import datetime
+import threading
+import contextlib
+import types
+
+
+class UniqueValueException(Exception):
+    # This exception is called when a record would have the same value as another record in a field which is unique
+    def __init__(self, error):
+        # This constructor for the exception takes an error message as its input
+        self.__error = error
 
 
 class EntityHandler(object):
     """This object manages the interfacing between the entities module (i.e the database) and any other parts of the
     code"""
-    def __init__(self):
-        """The constructor has no input or output but gets the dictionary of entities from a local file"""
-        # Creating an instance of a FileManager
-        self.__fM = fileManagement.FileManager()
-        try:
-            # Trying to load the contents of entities.p into the self.__entities variable
-            self.__entities = self.__fM.loadFile("entities.p")
-        except FileNotFoundError:
-            """If the file cannot be found, create a dictionary containing all the necessary entity types as keys and 
-            set their values to an empty dictionary"""
-            self.__entities = {"Teacher": {}, "Note": {}, "Assistant": {}, "Student": {}, "Class": {}, "Venue": {},
-                               "Event": {}, "AssistantClass": {}, "AssistantEvent": {}, "TeacherClass": {},
-                               "TeacherEvent": {}, "StudentClass": {}, "StudentEvent": {}, "VenueClass": {}, "VenueEvent": {},
-                               "UniformType": {}, "UniformOrder": {}, "UniformOrderLine": {}, "User": {}}
+    def __init__(self, backend=None, preload=None):
+        """The constructor takes the storage backend to use as its input. If none is given then a PickleBackend (which
+        stores each entity type in its own local file) is used. It sets up the dictionary of entities, which loads the
+        records of each entity type from the backend the first time that type is used.
+
+        It can also take a list of entity types to preload. If it does, the journal is replayed and those entity types
+        (followed by every other type) are loaded by a background thread, so the constructor returns straight away.
+        Anything that needs a record before the journal has been replayed waits for it to finish."""
+        if backend is None:
+            backend = storageBackends.PickleBackend()
+        self.__backend = backend
+        """This lock lets any number of threads (e.g. searches, PDFs and finance calculations) read the database at once, 
+        but only one thread change it, and not while it is being read (see ReadWriteLock)"""
+        self.__lock = ReadWriteLock()
+        # This lock ensures only one save can happen at a time
+        self.__saveLock = threading.Lock()
+        """Dictionaries of the records which have been changed or deleted since the last save, with entity types as keys 
+        and sets of record IDs as values. Only these records need to be written by the next save."""
+        self.__dirtyRecords = {}
+        self.__deletedRecords = {}
+        # The list of [entityType, ID] pairs of records whose changes were not saved as another user saved them first
+        self.__conflicts = []
+        self.__autosaver = None
+        self.__stopAutosave = threading.Event()
+        self.__preloader = None
+        """While a batch is running (see batch) these are the list of journal entries waiting to be written, a 
+        dictionary with (entityType, ID) pairs as keys and the state of each record changed by the batch before it was 
+        changed as values (used to undo the batch), and whether saveFile was called during the batch"""
+        self.__batchEntries = None
+        self.__batchUndo = None
+        self.__batchSave = False
+        # The list of [listener, entity types] pairs of the functions to call when the database is changed (see subscribe)
+        self.__listeners = []
+        # The list of changes which have been made but not yet passed to the listeners
+        self.__events = []
+        """A dictionary with entity types as keys and the dictionary of copied records given to the last snapshot of 
+        that type as values (see snapshot), and a dictionary with entity types as keys and sets of the IDs of the 
+        records changed or deleted since that snapshot was taken as values"""
+        self.__snapshots = {}
+        self.__snapshotChanges = {}
+        """This lock guards the two dictionaries above, as several threads may take snapshots at once while reading (see 
+        snapshot)"""
+        self.__snapshotLock = threading.Lock()
+        """The block of IDs reserved from the backend for new records (see __newID) - the next ID to use and the first ID 
+        after the end of the block. IDs are reserved a block at a time so the backend does not need to be asked for 
+        every new record."""
+        self.__nextID = 0
+        self.__endID = 0
+        self.__blockSize = 64
+        # The entity types which link two other records together
+        self.__relationships = ["AssistantClass", "AssistantEvent", "StudentClass", "StudentEvent", "TeacherClass",
+                                "TeacherEvent", "VenueClass", "VenueEvent"]
+        """A dictionary with relationship types as keys and an AdjacencyIndex of each type as values, so the links of a 
+        record can be found without looking through every relationship. These are only used if the backend keeps the 
+        records in memory - otherwise (e.g. SQLite) the backend's own indexes are used."""
+        self.__adjacency = {}
+        """A dictionary with the other entity types which have foreign keys (e.g. Note) as keys and a ReferenceIndex of 
+        each type as values, so the records referring to another record can be found without looking through them all"""
+        self.__references = {}
+        """A dictionary with "Class" and "Event" as keys and indexes of when the records of that type take place as 
+        values (a WeekdayIndex of classes and an IntervalIndex of events), used by the calendar functions such as 
+        todayClasses"""
+        self.__calendar = {}
+        """A dictionary with entity types as keys and dictionaries of {field: FieldIndex} as values (see registerIndex). 
+        The indexes are only kept up to date if the backend keeps the records in memory - otherwise lookup looks 
+        through the records instead."""
+        self.__fieldIndexes = {}
+        """A dictionary with the entity types which can be searched for as keys and a TokenIndex of the words in the 
+        search fields of each type as values (see search)"""
+        self.__searchIndexes = {}
+        if self.__backend.inMemory:
+            for relationship in self.__relationships:
+                self.__adjacency[relationship] = indexes.AdjacencyIndex()
+            for entityType in ["Note", "UniformOrder", "UniformOrderLine"]:
+                entityClass = getattr(entities, entityType)
+                positions = []
+                for field in entityClass.foreignKeys:
+                    positions.append(entityClass.fields.index(field))
+                # Notes are kept in the order they were created so the newest notes about a record can be found quickly
+                if entityType == "Note":
+                    self.__references[entityType] = indexes.ReferenceIndex(positions,
+                                                                           entityClass.fields.index("dateCreated"))
+                else:
+                    self.__references[entityType] = indexes.ReferenceIndex(positions)
+            self.__calendar["Class"] = indexes.WeekdayIndex(entities.Class.fields.index("day"))
+            self.__calendar["Event"] = indexes.IntervalIndex(entities.Event.fields.index("sDate"),
+                                                             entities.Event.fields.index("eDate"))
+            for entityType in ["Teacher", "Assistant", "Student", "Class", "Event", "Venue", "UniformType",
+                               "UniformOrder"]:
+                self.__searchIndexes[entityType] = indexes.TokenIndex()
+            self.__backend.setReloadListener(self.__reloaded)
+        """Creating an EntityStore containing all the necessary entity types. The records of a type are only loaded from 
+        the backend when they are first needed."""
+        self.__entities = EntityStore(["Teacher", "Note", "Assistant", "Student", "Class", "Venue", "Event",
+                                       "AssistantClass", "AssistantEvent", "TeacherClass", "TeacherEvent",
+                                       "StudentClass", "StudentEvent", "VenueClass", "VenueEvent", "UniformType",
+                                       "UniformOrder", "UniformOrderLine", "User"], self.__loadTable)
+        # Indexing the fields records are most often looked up by
+        self.registerIndex("User", "email", True)
+        for field in ["lastName", "email", "contactNumber", "postcode"]:
+            self.registerIndex("Student", field)
+        if preload is None:
+            # Re-applying any changes that were made after the database was last saved
+            self.__replayJournal()
+        else:
+            # The thread is a daemon so that it never stops the software from closing
+            locked = threading.Event()
+            self.__preloader = threading.Thread(target=self.__preload, args=(preload, locked), daemon=True)
+            # Stopping other threads from using the records until the preload thread has replayed the journal
+            self.__entities.pause(self.__preloader)
+            self.__preloader.start()
+            """Waiting for the preload thread to lock the database, so any other thread using the database waits for the 
+            lock rather than waiting for the journal while holding the lock"""
+            locked.wait()
 
     def updateRecord(self, entityType, ID, data):
         """This function updates a record in the database (this can be updating or creating). It takes an entityType,
         and ID and a list of data as its input. It then returns the ID of the record that has been dealt with."""
-        if ID is None:
-            """If there is the value of ID is None, then a new entity is being created. Create a temporary instance of 
-            the object matching entityType and set its attributes to 'data' by calling update()."""
-            tempEntity = getattr(entities, entityType)()
-            tempEntity.update(data)
-            # Hash the temporary entity object and convert this to a string to be used as the ID of the record
-            ID = str(hash(tempEntity))
-            """Add a new value to the dictionary at key entityType in self.__entities with ID as the key and the 
-            temporary entity as the value"""
-            self.__entities[entityType][ID] = tempEntity
-        else:
-            # If there is a value in self.__entities at key entityType and then key ID, update this value with 'data'
-            self.__entities[entityType][ID].update(data)
+        with self.__lock.write():
+            self.__checkUnique(entityType, ID, data)
+            if ID is None:
+                # If there is the value of ID is None, then a new entity is being created so a new ID is needed
+                ID = self.__newID(entityType)
+            # Set the attributes of the record matching ID to 'data' and record the change in the journal
+            self.__applyRecord(entityType, ID, data)
+            self.__journal(["record", entityType, ID, data])
         return ID
 
+    def importRecords(self, entityType, records, links):
+        """This function takes an entity type, a list containing a list of data for each new record and a list of the
+        relationships of each new record (a list of [relationship, list of parent IDs] pairs). It creates all of the
+        records and relationships at once and returns the list of IDs of the new records. The changes are recorded as a
+        single journal entry (and a single transaction in backends such as SQLite), which is much faster than calling
+        updateRecord and createRelationship for each one."""
+        with self.__lock.write():
+            newRecords = []
+            newRelationships = []
+            # Reserving enough IDs for every new record and relationship at once
+            count = len(records)
+            for recordLinks in links:
+                for relationship, parentIDs in recordLinks:
+                    count += len(parentIDs)
+            self.__reserveIDs(count)
+            for i in range(0, len(records)):
+                ID = self.__newID(entityType)
+                newRecords.append([ID, records[i]])
+                # The records are new, so they cannot already be linked to anything
+                for relationship, parentIDs in links[i]:
+                    for parentID in parentIDs:
+                        newRelationships.append([relationship, self.__newID(relationship), parentID, ID])
+            self.__applyImport(entityType, newRecords, newRelationships)
+            self.__journal(["import", entityType, newRecords, newRelationships])
+        IDs = []
+        for record in newRecords:
+            IDs.append(record[0])
+        return IDs
+
     def getUserAccess(self, username):
         """This function returns the user-access level of user with an ID matching 'username'"""
-        if username in self.__entities["User"].keys():
-            return self.__entities["User"][username].getAccess()
+        with self.__lock.read():
+            if username in self.__entities["User"]:
+                return self.__entities["User"][username].getAccess()
 
     def updateUser(self, username, data):
         """This function takes a username and a list of data as its input, updates the User account matching username and
         returns username. It follows a very similar procedure to updateRecord, however, username will not be None as this
         is user defined not automatically generated."""
-        if username in self.__entities["User"].keys():
-            self.__entities["User"][username].update(data)
-        else:
-            tempEntity = entities.User()
-            tempEntity.update(data)
-            self.__entities["User"][username] = tempEntity
+        with self.__lock.write():
+            self.__checkUnique("User", username, data)
+            self.__applyUser(username, data)
+            self.__journal(["user", username, data])
         return username
 
     def getNoteRecordID(self, ID):
         """This function takes the ID of a Note and returns the corresponding note's foreign keys"""
-        return self.__entities["Note"][ID].getIDs()
+        with self.__lock.read():
+            return self.__entities["Note"][ID].getIDs()
 
     def getData(self, entityType, ID):
         """This function takes an entityType and ID. It returns the attribute values (by calling returnValues) of the
         record of type 'entityType' matching ID"""
-        return self.__entities[entityType][ID].returnValues()
+        with self.__lock.read():
+            return self.__entities[entityType][ID].returnValues()
 
     def getOrderLines(self, ID):
         """This function takes an ID as its input and returns all of the UniformOrderLine records that contain ID (the
         ID of an order) as one of their foreign keys"""
-        output = []
-        for record in self.__entities["UniformOrderLine"]:
-            if self.__entities["UniformOrderLine"][record].getOrderID() == ID:
-                output.append(record)
-        return output
+        return self.findReferences("UniformOrderLine", ID)
+
+    def getOrderLineData(self, ID):
+        """This function takes the ID of an order as its input and returns a list of [lineID, values] pairs, one for each
+        UniformOrderLine in the order, where values are the attribute values of the line (see getData). This allows an
+        order to be displayed in one call rather than calling getData for each line."""
+        with self.__lock.read():
+            lines = []
+            for lineID in self.getOrderLines(ID):
+                lines.append([lineID, self.__entities["UniformOrderLine"][lineID].returnValues()])
+            return lines
+
+    def getNotes(self, ID, count=None):
+        """This function takes the ID of a record and a number of notes as its input and returns a list of the IDs of
+        the newest count notes about the record (or all of them if count is None), starting with the newest"""
+        with self.__lock.read():
+            # Making sure the notes have been loaded (and so indexed) before they are looked at
+            notes = self.__entities["Note"]
+            if "Note" in self.__references:
+                return self.__references["Note"].newest(ID, count)
+            # Without an index the notes about the record are sorted by the date they were created
+            IDs = sorted(self.__backend.findReferences("Note", ID), key=lambda note: notes[note].returnValues()[2],
+                         reverse=True)
+            if count is not None:
+                IDs = IDs[:count]
+            return IDs
 
     def getEmail(self, entityType, ID):
         """This fucntion takes an entity type and ID as its input and returns the email address of a record with ID 'ID'
         and of type 'entityType'"""
-        return self.__entities[entityType][ID].returnEmail()
+        with self.__lock.read():
+            return self.__entities[entityType][ID].returnEmail()
 
     def getNumber(self, entityType, ID):
-        return self.__entities[entityType][ID].returnNumber()
+        with self.__lock.read():
+            return self.__entities[entityType][ID].returnNumber()
 
     def getEntities(self):
-        """This function returns the dictionary of entities that is the private attribute of this class"""
+        """This function returns the EntityStore that is the private attribute of this class. It can be used like the
+        dictionary of entities, and each entity type is loaded when it is first accessed. A thread other than the one
+        changing the records should only look through it inside reading (or use a snapshot)."""
         return self.__entities
 
+    def reading(self):
+        """This function is used in a with statement (with handler.reading():) around code which looks through the
+        dictionary of entities directly (e.g. the Searcher). Other threads can read at the same time, but the records
+        are not changed until every thread has finished reading. A thread which is reading must not change the records."""
+        return self.__lock.read()
+
+    def getLinkCounts(self, entityType, ID):
+        """This function takes "Class" or "Event" and the ID of a record of that type as its input and returns a
+        dictionary with "Student", "Teacher" and "Assistant" as keys and the number of each linked to the class or event
+        as values. The counts are kept by the indexes of the relationships as they are created and deleted, so they are
+        not counted again here."""
+        with self.__lock.read():
+            counts = {}
+            for linkedType in ["Student", "Teacher", "Assistant"]:
+                relationship = linkedType + entityType
+                # Making sure the relationships have been loaded (and so indexed) before the index is used
+                self.__entities[relationship]
+                if relationship in self.__adjacency:
+                    counts[linkedType] = self.__adjacency[relationship].count(ID)
+                else:
+                    counts[linkedType] = len(self.__backend.findReferences(relationship, ID))
+            return counts
+
+    def getVenue(self, entityType, ID):
+        """This function takes "Class" or "Event" and the ID of a record of that type as its input and returns the ID of
+        the Venue it takes place in, or None if it does not have one"""
+        venues = self.getForeigns("Venue" + entityType, ID)
+        if len(venues) > 0:
+            return venues[0][1]
+        return None
+
     def getCost(self, ID):
         """This function takes an ID as its input and returns the hourly hire cost of a venue matching ID"""
-        return self.__entities["Venue"][ID].returnCost()
+        with self.__lock.read():
+            return self.__entities["Venue"][ID].returnCost()
 
     def getUsers(self):
         """This function returns the list of users in the database"""
         return self.__entities["User"]
 
+    def findReferences(self, entityType, ID):
+        """This function takes an entity type and an ID and returns a list of the IDs of the records of that type which
+        contain ID as one of their foreign keys (e.g. the notes about a student)"""
+        with self.__lock.read():
+            # Making sure the entity type has been loaded before the backend looks through it
+            self.__entities[entityType]
+            if entityType in self.__adjacency:
+                return self.__adjacency[entityType].references(ID)
+            if entityType in self.__references:
+                return self.__references[entityType].references(ID)
+            return self.__backend.findReferences(entityType, ID)
+
     def deleteOrderLines(self, ID):
         """This function takes the ID of an order as input and deletes all UniformOrderLine records which contain ID
         in the foreign keys"""
-        toDelete = []
-        for record in self.__entities["UniformOrderLine"]:
-            if self.__entities["UniformOrderLine"][record].getOrderID() == ID:
-                # Creating a list of UniformOrderLine records that contain ID in their foreign key
-                toDelete.append(record)
-        """Proceeding to delete all the times in the toDelete list. This is done in a separate loop to stop dictionary 
-        size changing mid iteration"""
-        for item in toDelete:
-            del self.__entities["UniformOrderLine"][item]
+        with self.__lock.write():
+            self.__applyDeleteOrderLines(ID)
+            self.__journal(["deleteOrderLines", ID])
+
+    def deleteOrders(self, IDs):
+        """This function takes a list of the IDs of orders as input and deletes each UniformOrder along with all of its
+        UniformOrderLine records. All of the deletions are recorded as a single journal entry."""
+        with self.__lock.write():
+            self.__applyDeleteOrders(IDs)
+            self.__journal(["deleteOrders", list(IDs)])
 
     def deleteRecord(self, entityType, ID):
         """This function takes an entity type and an ID as its input and deletes the record of type entityType matching
         ID"""
-        toDelete = []
-        # First any relationship type records containing ID in their foreign keys are added to a list of items to delete
-        for key in ["AssistantClass", "AssistantEvent", "StudentClass", "StudentEvent", "TeacherClass", "TeacherEvent",
-                    "VenueClass", "VenueEvent", "Note"]:
-            if entityType in key or key == "Note":
-                for record in self.__entities[key]:
-                    if ID in self.__entities[key][record].getIDs():
-                        toDelete.append([key, record])
-        # Deleting any records which are relationships involving the record with key ID
-        for item in toDelete:
-            del self.__entities[item[0]][item[1]]
-        # Deleting the record of type entityType matching ID
-        del self.__entities[entityType][ID]
+        with self.__lock.write():
+            self.__applyDelete(entityType, ID)
+            self.__journal(["delete", entityType, ID])
+
+    def deleteRecords(self, entityType, IDs):
+        """This function takes an entity type and a list of IDs as its input and deletes each record of type entityType
+        matching an ID, along with anything that refers to it (e.g. when several records are selected in a list). All of
+        the deletions are recorded as a single journal entry."""
+        with self.__lock.write():
+            self.__applyDeleteRecords(entityType, IDs)
+            self.__journal(["deleteRecords", entityType, list(IDs)])
 
     def deleteEntityRelationship(self, entityType, ID, parentID):
         """This function takes an entity type (which will be a relationship) and the ID of a record and the ID of another
         parent record. It finds any relationships with both foreign keys ID and parentID then it deletes it"""
-        toDelete = None
-        for record in self.__entities[entityType]:
-            if ID and parentID in self.__entities[entityType][record].getIDs():
-                toDelete = record
-        del self.__entities[entityType][toDelete]
+        with self.__lock.write():
+            self.__applyDeleteRelationship(entityType, ID, parentID)
+            self.__journal(["deleteRelationship", entityType, ID, parentID])
+
+    def snapshot(self, entityTypes=None):
+        """This function takes a list of entity types (or None for every type) and returns a Snapshot - a copy of the 
+        records of those types as they are now, which can be used like the dictionary of entities. It is meant for 
+        threads other than the GUI (e.g. producing PDFs, sending emails or exporting) which need to look through the 
+        records while they are being changed.
+
+        Copying every record each time would be slow, so the copy given to the last snapshot of each type is kept. A 
+        new snapshot shares the copies of the records which have not changed since then and only copies the records 
+        which have. The records in a snapshot are shared, so they must not be changed.
+
+        The records are copied while reading, so other threads (e.g. the GUI) can still read them while the snapshot is
+        taken, and a thread which is already reading can take a snapshot."""
+        if entityTypes is None:
+            entityTypes = self.__entities.keys()
+        tables = {}
+        with self.__lock.read():
+            with self.__snapshotLock:
+                for entityType in entityTypes:
+                    table = self.__entities[entityType]
+                    if entityType not in self.__snapshots:
+                        # The first snapshot of a type copies every record
+                        copies = {}
+                        for ID in table:
+                            copies[ID] = self.__copyRecord(entityType, ID)
+                    elif len(self.__snapshotChanges.get(entityType, set())) > 0:
+                        # Copying the dictionary but not the records, so the old snapshots keep their own records
+                        copies = dict(self.__snapshots[entityType])
+                        for ID in self.__snapshotChanges[entityType]:
+                            if ID in table:
+                                copies[ID] = self.__copyRecord(entityType, ID)
+                            else:
+                                copies.pop(ID, None)
+                    else:
+                        copies = self.__snapshots[entityType]
+                    self.__snapshots[entityType] = copies
+                    self.__snapshotChanges[entityType] = set()
+                    # The tables are read-only, as they may be shared with other snapshots
+                    tables[entityType] = types.MappingProxyType(copies)
+        return Snapshot(tables)
+
+    def subscribe(self, listener, entityTypes=None):
+        """This function takes a function and a list of entity types (or None for every type) as its input. After each
+        change to records of those types, the function is called with a list describing the change:
+        - ["created", entityType, ID], ["updated", entityType, ID] or ["deleted", entityType, ID] for a record
+        - ["linked", relationship, ID, parentID, childID] or ["unlinked", relationship, ID, parentID, childID] for a 
+          relationship record linking two other records
+        - ["reloaded", entityType, None] when the backend has replaced the records of a type with changes saved by
+          another copy of the software (this is called by the thread saving the database)
+        This lets widgets change only what is affected rather than fetching every record again. The function is
+        called once the change has been recorded (or once a batch has finished, and never if the batch is undone), in
+        the thread that made the change."""
+        with self.__lock.write():
+            self.__listeners.append([listener, entityTypes])
+
+    def unsubscribe(self, listener):
+        """This function takes a function passed to subscribe and stops it being called"""
+        with self.__lock.write():
+            for item in list(self.__listeners):
+                if item[0] == listener:
+                    self.__listeners.remove(item)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """This function is used in a with statement (with handler.batch():) to group several changes together. The
+        database is locked for the whole batch, so no other thread (e.g. the autosave) can see or save half of it, and
+        the changes are written to the journal as a single entry at the end. If an exception is raised inside the batch
+        then every change made by it is undone before the exception is passed on. A batch inside another batch is part
+        of the outer one."""
+        with self.__lock.write():
+            if self.__batchEntries is not None:
+                yield
+                return
+            self.__batchEntries = []
+            self.__batchUndo = {}
+            self.__batchSave = False
+            try:
+                yield
+            except BaseException:
+                self.__rollback()
+                # The changes never happened, so the listeners are not told about them
+                self.__events = []
+                raise
+            else:
+                entries = self.__batchEntries
+                self.__batchEntries = None
+                if len(entries) > 0:
+                    self.__journal(["batch", entries])
+            finally:
+                self.__batchEntries = None
+                self.__batchUndo = None
+        # If saveFile was called during the batch then the save happens now the batch is finished
+        if self.__batchSave:
+            self.__batchSave = False
+            self.saveFile()
 
     def saveFile(self):
-        """This function saves the contents of the self.__entities dictionary back into the local entities file"""
-        self.__fM.saveFile("entities.p", self.__entities)
+        """This function saves the entity types which have been changed using the storage backend. It can be called
+        from any thread. The database is only locked while the backend prepares the save (e.g. takes a copy of the
+        changed records), so it can still be used while the save is written."""
+        with self.__saveLock:
+            with self.__lock.write():
+                # A batch is never saved half way through, so the save is left until the batch has finished
+                if self.__batchEntries is not None:
+                    self.__batchSave = True
+                    return
+                prepared = self.__backend.prepareSave(self.__dirtyRecords, self.__deletedRecords)
+                savedRecords = self.__dirtyRecords
+                savedDeletions = self.__deletedRecords
+                self.__dirtyRecords = {}
+                self.__deletedRecords = {}
+            try:
+                self.__backend.writeSave(prepared)
+            except OSError:
+                # The changes are still in the journal, so they are kept for the next save
+                with self.__lock.write():
+                    self.__restoreChanges(savedRecords, savedDeletions)
+                raise
+            finally:
+                with self.__lock.write():
+                    self.__conflicts.extend(self.__backend.getConflicts())
+
+    def getConflicts(self):
+        """This function returns the list of [entityType, ID] pairs of the records whose changes could not be saved since
+        this function was last called, because another copy of the software using the same data saved a change to them
+        first. The records now hold the other copy's values."""
+        with self.__lock.write():
+            conflicts = self.__conflicts
+            self.__conflicts = []
+        return conflicts
+
+    def startAutosave(self, interval=30):
+        """This function takes a number of seconds as its input and starts a background thread which saves the database
+        at that interval, but only if there have been changes since the last save"""
+        if self.__autosaver is None:
+            self.__stopAutosave.clear()
+            # The thread is a daemon so that it never stops the software from closing
+            self.__autosaver = threading.Thread(target=self.__autosave, args=(interval,), daemon=True)
+            self.__autosaver.start()
+
+    def close(self):
+        """This function stops the autosave thread and saves any changes that have not been saved yet. It is called when
+        the software is closed."""
+        # Waiting for the records to finish loading, so the backend is not closed while it is still being read
+        if self.__preloader is not None:
+            self.__preloader.join()
+        if self.__autosaver is not None:
+            self.__stopAutosave.set()
+            self.__autosaver.join()
+            self.__autosaver = None
+        if self.__hasChanges():
+            self.saveFile()
+        self.__backend.close()
 
     def createRelationship(self, relationship, parentID, ID):
         """This function takes a relationship, parentID and ID as its input and creates a new relationship of type
         'relationship' with foreign keys parentId and ID"""
-        check = True
-        # The following checks that such a relationship between parentID and ID does not already exist
-        for record in self.__entities[relationship]:
-            if parentID in self.__entities[relationship][record].getIDs() and ID in self.__entities[relationship][record].getIDs():
-                check = False
-        # If no relationship exists then a new one is created with a similar method to the updateRecord function
-        if check:
-            tempEntity = getattr(entities, relationship)()
-            tempEntity.update(parentID, ID)
-            ID = str(hash(tempEntity))
-            self.__entities[relationship][ID] = tempEntity
+        with self.__lock.write():
+            # The following checks that such a relationship between parentID and ID does not already exist
+            check = self.__findRelationship(relationship, parentID, ID) is None
+            # If no relationship exists then a new one is created with a similar method to the updateRecord function
+            if check:
+                recordID = self.__newID(relationship)
+                self.__applyRelationship(relationship, recordID, parentID, ID)
+                self.__journal(["relationship", relationship, recordID, parentID, ID])
+
+    def createRelationships(self, relationship, parentID, IDs):
+        """This function takes a relationship, parentID and a list of IDs as its input and creates a relationship of
+        type 'relationship' between parentID and each ID that is not already linked to it (e.g. enrolling many students
+        in a class at once). All of the new relationships are recorded as a single journal entry."""
+        with self.__lock.write():
+            newRelationships = []
+            self.__reserveIDs(len(IDs))
+            for ID in IDs:
+                if self.__findRelationship(relationship, parentID, ID) is None:
+                    newRelationship = [relationship, self.__newID(relationship), parentID, ID]
+                    self.__applyRelationship(*newRelationship)
+                    newRelationships.append(newRelationship)
+            if len(newRelationships) > 0:
+                self.__journal(["relationships", newRelationships])
 
     def getForeigns(self, relationship, ID):
         """This function takes a relationship and ID as its input and returns the ID and other foreign key of the
         record of type 'relationship' which contains 'ID' as one of its foreign keys"""
-        output = []
-        for record in self.__entities[relationship]:
-            value = self.__entities[relationship][record]
-            """If the first foreign key is ID then return a list containing the ID of the relationship and the second 
-            foreign key"""
-            if value.getIDs()[0] == ID:
-                output.append([record, value.getIDs()[1]])
-            """If the second foreign key is ID then reutrn a list containing the ID of the relationship and the first 
-            foreign key"""
-            if value.getIDs()[1] == ID:
-                output.append([record, value.getIDs()[0]])
-        return output
+        with self.__lock.read():
+            output = []
+            table = self.__entities[relationship]
+            # If there is an index of the relationship then it already holds the list needed
+            if relationship in self.__adjacency:
+                return self.__adjacency[relationship].foreigns(ID)
+            # Only the relationships which contain ID as a foreign key are looked at
+            for record in self.__backend.findReferences(relationship, ID):
+                value = table[record]
+                """If the first foreign key is ID then return a list containing the ID of the relationship and the second 
+                foreign key"""
+                if value.getIDs()[0] == ID:
+                    output.append([record, value.getIDs()[1]])
+                """If the second foreign key is ID then reutrn a list containing the ID of the relationship and the first 
+                foreign key"""
+                if value.getIDs()[1] == ID:
+                    output.append([record, value.getIDs()[0]])
+            return output
+
+    def registerIndex(self, entityType, field, unique=False):
+        """This function takes an entity type, the name of one of its fields and whether each value of the field should
+        only be used by one record (e.g. the email of a User). It creates an index of the field, which is kept up to
+        date as records are changed, so records can be found by the value of the field using lookup. If unique is True
+        then updateRecord and updateUser raise a UniqueValueException rather than give a second record the same value."""
+        index = indexes.FieldIndex(getattr(entities, entityType).fields.index(field), unique)
+        with self.__lock.write():
+            self.__fieldIndexes.setdefault(entityType, {})[field] = index
+            # If the records have already been loaded then they are indexed now, otherwise they are indexed as they load
+            if self.__backend.inMemory and self.__entities.isLoaded(entityType):
+                index.build(self.__entities[entityType])
+
+    def lookup(self, entityType, field, value):
+        """This function takes an entity type, the name of one of its fields and a value as its input and returns a list
+        of the IDs of the records of that type with that value in the field. Strings are compared ignoring case and any
+        spaces at either end. If the field has not been indexed then every record is looked at."""
+        with self.__lock.read():
+            table = self.__entities[entityType]
+            if self.__backend.inMemory and field in self.__fieldIndexes.get(entityType, {}):
+                return self.__fieldIndexes[entityType][field].lookup(value)
+            index = indexes.FieldIndex(getattr(entities, entityType).fields.index(field))
+            index.build(table)
+            return index.lookup(value)
+
+    def query(self, entityType, where=None, fields=None, orderBy=None, limit=None):
+        """This function finds the records of type entityType matching a query and yields a list for each one, one at a
+        time, containing its ID followed by the values of its fields. It takes:
+        - where: a dictionary with field names as keys. Each value is either the value the field must have or a function
+          which takes the value of the field and returns True if the record matches. If where is None every record matches.
+        - fields: a list of the names of the fields to return the values of (all of them, in order, if it is None)
+        - orderBy: a field name (or list of field names) to sort the records by, starting with '-' to sort in descending
+          order (e.g. "-dateCreated"). If it is None the records are not sorted.
+        - limit: the greatest number of records to return (all of them if it is None)
+        If there is an index of one of the fields in where then only the records it contains are looked at (see explain)."""
+        if where is None:
+            where = {}
+        entityClass = getattr(entities, entityType)
+        if fields is None:
+            fields = entityClass.fields
+        positions = []
+        for field in fields:
+            positions.append(entityClass.fields.index(field))
+        conditions = []
+        for field in where:
+            conditions.append([entityClass.fields.index(field), where[field]])
+        with self.__lock.read():
+            table = self.__entities[entityType]
+            IDs = self.__planQuery(entityType, where)[1]
+        # If the records are not sorted then each one is returned as soon as it is found
+        if orderBy is None:
+            matches = self.__queryRows(table, IDs, conditions)
+        else:
+            matches = self.__sortRows(entityType, self.__queryRows(table, IDs, conditions), orderBy)
+        count = 0
+        for ID, row in matches:
+            if limit is not None and count >= limit:
+                return
+            values = [ID]
+            for position in positions:
+                values.append(row[position])
+            yield values
+            count += 1
+
+    def explain(self, entityType, where=None):
+        """This function takes an entity type and the where dictionary of a query (see query) and returns a string
+        describing how the query would find its records - which index it would use (if any) and how many records it
+        would look at"""
+        with self.__lock.read():
+            if where is None:
+                where = {}
+            description, IDs = self.__planQuery(entityType, where)
+            return description + " (" + str(len(IDs)) + " records looked at)"
+
+    def search(self, entityType, entry):
+        """This function takes an entity type and a search entry (e.g. typed in the search bar) as its input and returns
+        a list of the IDs of the records of that type matching it, in the order they were created. A record matches if
+        each word in the entry is the start of a word in its search fields (e.g. "ann smi" finds Anne Smith). If the
+        entry does not contain any words then every record is returned. The words are looked up in the search index of
+        the type, so only the matching records are looked at."""
+        with self.__lock.read():
+            table = self.__entities[entityType]
+            if entityType in self.__searchIndexes:
+                IDs = self.__searchIndexes[entityType].search(entry)
+            else:
+                # Without an index every record is looked at
+                index = indexes.TokenIndex()
+                words = index.words(entry)
+                IDs = None
+                if len(words) > 0:
+                    IDs = []
+                    for ID in table:
+                        if index.matches(table[ID], words):
+                            IDs.append(ID)
+            if IDs is None:
+                return list(table.keys())
+            # IDs are allocated in order, so sorting them puts the records in the order they were created
+            return sorted(IDs)
+
+    def findDuplicates(self, entityType, data):
+        """This function takes a Person type (e.g. Student) and a list of data for a record of that type and returns a
+        list of the IDs of the records of that type with the same first name, last name and date of birth"""
+        with self.__lock.read():
+            IDs = []
+            # Only the records with the same last name need to be looked at
+            for ID in self.lookup(entityType, "lastName", data[1]):
+                values = self.__entities[entityType][ID].returnValues()
+                if values[0].strip().lower() == data[0].strip().lower() and values[2] == data[2]:
+                    IDs.append(ID)
+            return IDs
 
     def accountExists(self, username):
         """This function takes a username as its input and returns True if that username exists as the primary key of
         a User account object in the database and returns False if not"""
-        if username in self.__entities["User"].keys():
-            return True
-        else:
-            return False
+        with self.__lock.read():
+            if username in self.__entities["User"]:
+                return True
+            else:
+                return False
 
     def todayClasses(self):
         """This function returns a list of classes that take place on the current day of the week"""
-        IDList = []
-        days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-        for aclass in self.__entities["Class"]:
-            """If the current day of the week as an integer is the same as the index of the day of the week of the class
-            in the list 'days' then append the ID of that class to IDList"""
-            if datetime.datetime.today().weekday() == days.index(self.__entities["Class"][aclass].returnDay()):
-                IDList.append(aclass)
-        return IDList
+        return self.runsOn(datetime.date.today())["Class"]
 
     def monthEvents(self):
-        """This function returns a list of events that start in the current month"""
-        IDList = []
-        for event in self.__entities["Event"]:
-            eventDateObject = self.__entities["Event"][event].returnStartDate()
-            # If the month and year of the event's start date is that of the current date then append event to IDList
-            if eventDateObject.month == datetime.datetime.now().month and eventDateObject.year == datetime.datetime.now().year:
-                IDList.append(event)
-        return IDList
+        """This function returns a list of events that start in the current month, in order of their start date"""
+        with self.__lock.read():
+            today = datetime.date.today()
+            start = today.replace(day=1)
+            # Finding the last day of the month by going to the first day of the next month and going back one day
+            if today.month == 12:
+                end = start.replace(year=today.year + 1, month=1) - datetime.timedelta(days=1)
+            else:
+                end = start.replace(month=today.month + 1) - datetime.timedelta(days=1)
+            if "Event" in self.__calendar:
+                # Making sure the events have been loaded (and so indexed) before the index is used
+                self.__entities["Event"]
+                return self.__calendar["Event"].starting(start, end)
+            IDList = []
+            for event in self.__entities["Event"]:
+                eventDateObject = self.__entities["Event"][event].returnStartDate()
+                # If the month and year of the event's start date is that of the current date then append event to IDList
+                if eventDateObject.month == today.month and eventDateObject.year == today.year:
+                    IDList.append(event)
+            return IDList
+
+    def runsOn(self, date):
+        """This function takes a date as its input and returns a dictionary with "Class" and "Event" as keys and lists
+        of the IDs of the classes and events which take place on that date as values"""
+        return self.runsBetween(date, date)
+
+    def runsBetween(self, start, end):
+        """This function takes two dates as its input and returns a dictionary with "Class" and "Event" as keys and lists
+        of the IDs of the classes and events which take place on at least one day between them (inclusive) as values.
+        Events are in order of their start date."""
+        with self.__lock.read():
+            # Making sure the classes and events have been loaded (and so indexed) before the indexes are used
+            classes = self.__entities["Class"]
+            events = self.__entities["Event"]
+            if "Class" in self.__calendar:
+                return {"Class": self.__calendar["Class"].between(start, end),
+                        "Event": self.__calendar["Event"].between(start, end)}
+            # Without the indexes every class and event is looked at
+            weekdays = indexes.WeekdayIndex(entities.Class.fields.index("day"))
+            weekdays.build(classes)
+            interval = indexes.IntervalIndex(entities.Event.fields.index("sDate"), entities.Event.fields.index("eDate"))
+            interval.build(events)
+            return {"Class": weekdays.between(start, end), "Event": interval.between(start, end)}
+
+    def nextEvents(self, count, date=None):
+        """This function takes a number of events and a date (which is the current date if it is not given) as its
+        input and returns a list of the IDs of the first count events starting on or after that date"""
+        with self.__lock.read():
+            if date is None:
+                date = datetime.date.today()
+            events = self.__entities["Event"]
+            if "Event" in self.__calendar:
+                return self.__calendar["Event"].upcoming(date, count)
+            interval = indexes.IntervalIndex(entities.Event.fields.index("sDate"), entities.Event.fields.index("eDate"))
+            interval.build(events)
+            return interval.upcoming(date, count)
+
+    def __applyRecord(self, entityType, ID, data):
+        """This function takes an entityType, ID and list of data and sets the attributes of the record matching ID to
+        'data'. If there is no such record (which happens when the journal is replayed) then it is created."""
+        self.__remember(entityType, ID)
+        existed = ID in self.__entities[entityType]
+        if existed:
+            record = self.__entities[entityType][ID]
+        else:
+            record = getattr(entities, entityType)()
+        record.update(data)
+        # Putting the record back into its table, as some backends (e.g. SQLite) do not hold the record object itself
+        self.__entities[entityType][ID] = record
+        self.__indexRecord(entityType, ID)
+        self.__markChanged(entityType, ID)
+        self.__publish("updated" if existed else "created", entityType, ID)
+
+    def __applyUser(self, username, data):
+        """This function takes a username and a list of data and updates (or creates) the matching User account"""
+        self.__remember("User", username)
+        existed = username in self.__entities["User"]
+        if existed:
+            tempEntity = self.__entities["User"][username]
+        else:
+            tempEntity = entities.User()
+        tempEntity.update(data)
+        self.__entities["User"][username] = tempEntity
+        self.__indexRecord("User", username)
+        self.__markChanged("User", username)
+        self.__publish("updated" if existed else "created", "User", username)
+
+    def __applyRelationship(self, relationship, recordID, parentID, ID):
+        """This function takes a relationship type, the ID of the relationship record and its two foreign keys and sets
+        the foreign keys of that record (creating it if it does not exist)"""
+        self.__remember(relationship, recordID)
+        # If the record already exists (which happens when the journal is replayed) its old links are removed first
+        existed = recordID in self.__entities[relationship]
+        if existed:
+            self.__unindexRecord(relationship, recordID)
+        record = getattr(entities, relationship)()
+        record.update(parentID, ID)
+        self.__entities[relationship][recordID] = record
+        self.__indexRecord(relationship, recordID)
+        self.__markChanged(relationship, recordID)
+        if not existed:
+            self.__publish("linked", relationship, recordID)
+
+    def __applyRelationships(self, relationships):
+        """This function takes a list of [relationship, recordID, parentID, ID] lists and creates each relationship"""
+        for relationship in relationships:
+            self.__applyRelationship(*relationship)
+
+    def __applyImport(self, entityType, records, relationships):
+        """This function takes an entity type, a list of [ID, data] pairs and a list of [relationship, recordID, parentID,
+        ID] lists and creates all of the records and relationships"""
+        for ID, data in records:
+            self.__applyRecord(entityType, ID, data)
+        self.__applyRelationships(relationships)
+
+    def __applyDeleteOrderLines(self, ID):
+        """This function deletes all UniformOrderLine records which contain ID (the ID of an order) as a foreign key"""
+        # Creating a list of UniformOrderLine records that contain ID in their foreign key
+        toDelete = self.findReferences("UniformOrderLine", ID)
+        """Proceeding to delete all the times in the toDelete list. This is done in a separate loop to stop dictionary 
+        size changing mid iteration"""
+        for item in toDelete:
+            self.__remember("UniformOrderLine", item)
+            self.__publish("deleted", "UniformOrderLine", item)
+            self.__unindexRecord("UniformOrderLine", item)
+            del self.__entities["UniformOrderLine"][item]
+            self.__markDeleted("UniformOrderLine", item)
+
+    def __applyDeleteOrders(self, IDs):
+        """This function deletes the UniformOrder matching each ID in IDs and all of its UniformOrderLine records"""
+        for ID in IDs:
+            self.__applyDeleteOrderLines(ID)
+            self.__applyDelete("UniformOrder", ID)
+
+    def __applyMigrateIDs(self, newIDs):
+        """This function takes a dictionary with old IDs as keys and the new IDs to replace them with as values. It
+        changes the ID of every record with an old ID and every foreign key containing an old ID."""
+        for entityType in self.__entities.keys():
+            if entityType == "User":
+                continue
+            table = self.__entities[entityType]
+            entityClass = getattr(entities, entityType)
+            positions = []
+            for field in entityClass.foreignKeys:
+                positions.append(entityClass.fields.index(field))
+            for ID in list(table):
+                record = table[ID]
+                row = record.exportRow()
+                changed = False
+                for position in positions:
+                    if row[position] in newIDs:
+                        row[position] = newIDs[row[position]]
+                        changed = True
+                if changed:
+                    record.importRow(row)
+                if ID in newIDs:
+                    # Moving the record to its new ID
+                    del table[ID]
+                    self.__markDeleted(entityType, ID)
+                    table[newIDs[ID]] = record
+                    self.__markChanged(entityType, newIDs[ID])
+                elif changed:
+                    table[ID] = record
+                    self.__markChanged(entityType, ID)
+            self.__rebuildIndexes(entityType)
+
+    def __applyDelete(self, entityType, ID):
+        """This function deletes the record of type entityType matching ID along with anything that refers to it. The
+        records referring to it are found using the indexes, so only they are looked at."""
+        toDelete = []
+        # First any relationship type records containing ID in their foreign keys are added to a list of items to delete
+        for key in self.__relationships + ["Note"]:
+            if entityType in key or key == "Note":
+                for record in self.findReferences(key, ID):
+                    toDelete.append([key, record])
+        # Deleting any records which are relationships involving the record with key ID (or notes about it)
+        for item in toDelete:
+            self.__remember(item[0], item[1])
+            self.__publish("deleted", item[0], item[1])
+            self.__unindexRecord(item[0], item[1])
+            del self.__entities[item[0]][item[1]]
+            self.__markDeleted(item[0], item[1])
+        # Deleting the record of type entityType matching ID (it may already be gone if the journal is replayed twice)
+        if ID in self.__entities[entityType]:
+            self.__remember(entityType, ID)
+            self.__publish("deleted", entityType, ID)
+            self.__unindexRecord(entityType, ID)
+            del self.__entities[entityType][ID]
+            self.__markDeleted(entityType, ID)
+
+    def __applyDeleteRecords(self, entityType, IDs):
+        """This function deletes the record of type entityType matching each ID in IDs (see __applyDelete)"""
+        for ID in IDs:
+            self.__applyDelete(entityType, ID)
+
+    def __applyBatch(self, entries):
+        """This function takes the list of journal entries written by a batch and applies each of them"""
+        for entry in entries:
+            self.__applyEntry(entry)
+
+    def __remember(self, entityType, ID):
+        """This function takes an entity type and an ID and, if a batch is running and the record has not already been
+        changed by it, stores the record's values (or None if it does not exist) and whether it was waiting to be saved,
+        so the batch can be undone. It is called just before a record is changed or deleted."""
+        if self.__batchUndo is None or (entityType, ID) in self.__batchUndo:
+            return
+        row = None
+        if ID in self.__entities[entityType]:
+            row = list(self.__entities[entityType][ID].exportRow())
+        self.__batchUndo[(entityType, ID)] = [row, ID in self.__dirtyRecords.get(entityType, set()),
+                                              ID in self.__deletedRecords.get(entityType, set())]
+
+    def __publish(self, kind, entityType, ID):
+        """This function takes the kind of change ("created", "updated" or "deleted"), an entity type and the ID of the
+        record changed and stores an event describing it, which is passed to the listeners by __deliver. It is called
+        while the record still exists. The change to a relationship record is described as "linked" or "unlinked"."""
+        if len(self.__listeners) == 0:
+            return
+        event = [kind, entityType, ID]
+        if entityType in self.__relationships:
+            if kind == "deleted":
+                event[0] = "unlinked"
+            row = self.__entities[entityType][ID].exportRow()
+            event.extend([row[0], row[1]])
+        self.__events.append(event)
+
+    def __deliver(self):
+        """This function passes each stored event to the listeners subscribed to its entity type. If a listener raises
+        an exception then the events are still passed to every other listener (the change has already been made, so
+        they must all be told about it) and the first exception is raised once they have been."""
+        events = self.__events
+        self.__events = []
+        error = None
+        for event in events:
+            for listener, entityTypes in list(self.__listeners):
+                if entityTypes is None or event[1] in entityTypes:
+                    try:
+                        listener(event)
+                    except Exception as exception:
+                        if error is None:
+                            error = exception
+        if error is not None:
+            raise error
+
+    def __rollback(self):
+        """This function undoes every change made by the current batch, by putting each record it changed back to the
+        state stored by __remember"""
+        for key, state in reversed(list(self.__batchUndo.items())):
+            entityType, ID = key
+            row, wasChanged, wasDeleted = state
+            table = self.__entities[entityType]
+            if ID in table:
+                self.__unindexRecord(entityType, ID)
+                del table[ID]
+            if row is not None:
+                record = getattr(entities, entityType)()
+                record.importRow(row)
+                table[ID] = record
+                self.__indexRecord(entityType, ID)
+            # Putting back whether the record was waiting to be saved
+            for records, was in [[self.__dirtyRecords, wasChanged], [self.__deletedRecords, wasDeleted]]:
+                if was:
+                    records.setdefault(entityType, set()).add(ID)
+                elif entityType in records:
+                    records[entityType].discard(ID)
+            self.__markSnapshot(entityType, ID)
+
+    def __applyDeleteRelationship(self, entityType, ID, parentID):
+        """This function deletes the relationship of type entityType between the records matching ID and parentID"""
+        toDelete = self.__findRelationship(entityType, parentID, ID)
+        if toDelete is not None:
+            self.__remember(entityType, toDelete)
+            self.__publish("deleted", entityType, toDelete)
+            self.__unindexRecord(entityType, toDelete)
+            del self.__entities[entityType][toDelete]
+            self.__markDeleted(entityType, toDelete)
+
+    def __findRelationship(self, relationship, parentID, ID):
+        """This function takes a relationship type and two IDs and returns the ID of the relationship record linking
+        them, or None if they are not linked"""
+        table = self.__entities[relationship]
+        if relationship in self.__adjacency:
+            return self.__adjacency[relationship].find(parentID, ID)
+        for record in self.__backend.findReferences(relationship, parentID):
+            if ID in table[record].getIDs():
+                return record
+        return None
+
+    def __loadTable(self, entityType):
+        """This function is used by the EntityStore to load the records of an entity type. It loads them from the backend
+        and builds any indexes of that type."""
+        table = self.__backend.loadTable(entityType)
+        if entityType in self.__adjacency:
+            self.__adjacency[entityType].build(table)
+        for recordIndexes in [self.__references, self.__calendar, self.__searchIndexes]:
+            if entityType in recordIndexes:
+                recordIndexes[entityType].build(table)
+        for index in self.__fieldIndexesOf(entityType):
+            index.build(table)
+        return table
+
+    def __reloaded(self, entityType):
+        """This function is called by the backend with an entity type whose records it has replaced (e.g. with changes
+        saved by another copy of the software). It rebuilds the indexes of the type and tells the listeners."""
+        self.__rebuildIndexes(entityType)
+        # Every record of the type may have changed, so the next snapshot copies them all again
+        with self.__snapshotLock:
+            self.__snapshots.pop(entityType, None)
+            self.__snapshotChanges.pop(entityType, None)
+        if len(self.__listeners) > 0:
+            self.__events.append(["reloaded", entityType, None])
+            self.__deliver()
+
+    def __rebuildIndexes(self, entityType):
+        """This function takes an entity type whose records have been replaced by the backend and rebuilds its indexes"""
+        if entityType in self.__adjacency:
+            self.__adjacency[entityType].build(self.__entities[entityType])
+        for recordIndexes in [self.__references, self.__calendar, self.__searchIndexes]:
+            if entityType in recordIndexes:
+                recordIndexes[entityType].build(self.__entities[entityType])
+        for index in self.__fieldIndexesOf(entityType):
+            index.build(self.__entities[entityType])
+
+    def __indexRecord(self, entityType, ID):
+        """This function takes an entity type and the ID of a record of that type which has just been created or changed
+        and adds it to the indexes of that type (if there are any)"""
+        if entityType in self.__adjacency:
+            row = self.__entities[entityType][ID].exportRow()
+            self.__adjacency[entityType].add(ID, row[0], row[1])
+        for recordIndexes in [self.__references, self.__calendar, self.__searchIndexes]:
+            if entityType in recordIndexes:
+                recordIndexes[entityType].add(ID, self.__entities[entityType][ID])
+        for index in self.__fieldIndexesOf(entityType):
+            index.add(ID, self.__entities[entityType][ID])
+
+    def __unindexRecord(self, entityType, ID):
+        """This function takes an entity type and the ID of a record of that type (which must still exist) and removes it
+        from the indexes of that type"""
+        if entityType in self.__adjacency:
+            row = self.__entities[entityType][ID].exportRow()
+            self.__adjacency[entityType].remove(ID, row[0], row[1])
+        for recordIndexes in [self.__references, self.__calendar, self.__searchIndexes]:
+            if entityType in recordIndexes:
+                recordIndexes[entityType].remove(ID)
+        for index in self.__fieldIndexesOf(entityType):
+            index.remove(ID)
+
+    def __fieldIndexesOf(self, entityType):
+        """This function takes an entity type and returns a list of the field indexes of that type which need to be kept
+        up to date (none if the backend does not keep the records in memory)"""
+        if not self.__backend.inMemory:
+            return []
+        return list(self.__fieldIndexes.get(entityType, {}).values())
+
+    def __planQuery(self, entityType, where):
+        """This function takes an entity type and the where dictionary of a query and returns a description of how the
+        records will be found along with the list of IDs of the records to look at. Every field in where with a value
+        (rather than a function) which is a foreign key, has a field index or (for a Class) is the day is looked up in
+        its index, and the index returning the fewest records is used. If none can be used every record is looked at."""
+        table = self.__entities[entityType]
+        foreignKeys = getattr(entities, entityType).foreignKeys
+        best = None
+        for field in where:
+            value = where[field]
+            if callable(value):
+                continue
+            IDs = None
+            if field in foreignKeys:
+                # findReferences uses the adjacency or reference index of the type (or the backend's own index)
+                IDs = self.findReferences(entityType, value)
+            elif field in self.__fieldIndexes.get(entityType, {}) and self.__backend.inMemory:
+                IDs = self.__fieldIndexes[entityType][field].lookup(value)
+            elif entityType == "Class" and field == "day" and "Class" in self.__calendar:
+                IDs = []
+                if value in indexes.WeekdayIndex.days:
+                    IDs = self.__calendar["Class"].on(indexes.WeekdayIndex.days.index(value))
+            if IDs is not None and (best is None or len(IDs) < len(best[1])):
+                best = ["index of " + entityType + "." + field, IDs]
+        if best is None:
+            # The IDs are copied so records can be added or deleted while the query is running
+            best = ["scan of every " + entityType, list(table.keys())]
+        return best
+
+    def __queryRows(self, table, IDs, conditions):
+        """This function takes a dictionary of records, a list of IDs and a list of [position, value or function] pairs
+        and yields an (ID, row) pair for each record in IDs whose row (from exportRow) meets every condition. Indexes
+        may return records which do not match exactly (e.g. a different case), so every record is checked. The
+        database is only locked while each record is read, so it can be changed while the rows are being used."""
+        for ID in IDs:
+            with self.__lock.read():
+                try:
+                    # Copying the values, as the record may be changed once the lock is released
+                    row = list(table[ID].exportRow())
+                except KeyError:
+                    # The record has been deleted since the query started
+                    continue
+            matched = True
+            for position, value in conditions:
+                if callable(value):
+                    if not value(row[position]):
+                        matched = False
+                elif row[position] != value:
+                    matched = False
+            if matched:
+                yield ID, row
+
+    def __sortRows(self, entityType, rows, orderBy):
+        """This function takes an entity type, an iterable of (ID, row) pairs and a field name or list of field names
+        (see query) and returns a list of the pairs sorted by those fields"""
+        if isinstance(orderBy, str):
+            orderBy = [orderBy]
+        rows = list(rows)
+        # Sorting by the last field first, as each sort keeps the order of records with the same value
+        for field in reversed(orderBy):
+            descending = field.startswith("-")
+            position = getattr(entities, entityType).fields.index(field.lstrip("-"))
+            # Records with no value are put before any with a value (so they can still be compared)
+            rows.sort(key=lambda pair: (pair[1][position] is not None, pair[1][position]), reverse=descending)
+        return rows
+
+    def __checkUnique(self, entityType, ID, data):
+        """This function takes an entity type, the ID of a record (None if it is new) and the data it is about to be
+        given. It raises a UniqueValueException if a unique field in data has the same value as another record."""
+        for field, index in list(self.__fieldIndexes.get(entityType, {}).items()):
+            if index.isUnique():
+                value = data[getattr(entities, entityType).fields.index(field)]
+                for otherID in self.lookup(entityType, field, value):
+                    if otherID != ID:
+                        raise UniqueValueException("The " + field + " " + str(value) + " is already used")
+
+    def __markChanged(self, entityType, ID):
+        """This function takes an entity type and an ID and records that the record matching ID has been created or
+        changed since the last save"""
+        self.__dirtyRecords.setdefault(entityType, set()).add(ID)
+        if entityType in self.__deletedRecords:
+            self.__deletedRecords[entityType].discard(ID)
+        self.__markSnapshot(entityType, ID)
+
+    def __markDeleted(self, entityType, ID):
+        """This function takes an entity type and an ID and records that the record matching ID has been deleted since
+        the last save"""
+        self.__deletedRecords.setdefault(entityType, set()).add(ID)
+        if entityType in self.__dirtyRecords:
+            self.__dirtyRecords[entityType].discard(ID)
+        self.__markSnapshot(entityType, ID)
+
+    def __markSnapshot(self, entityType, ID):
+        """This function takes an entity type and an ID and, if a snapshot of that type has been taken, records that the
+        record matching ID has changed since (so the next snapshot copies it again)"""
+        with self.__snapshotLock:
+            if entityType in self.__snapshots:
+                self.__snapshotChanges.setdefault(entityType, set()).add(ID)
+
+    def __copyRecord(self, entityType, ID):
+        """This function takes an entity type and an ID and returns a new record with the same values as the record
+        matching ID, which is not changed when the original record is"""
+        record = getattr(entities, entityType)()
+        record.importRow(list(self.__entities[entityType][ID].exportRow()))
+        return record
+
+    def __hasChanges(self):
+        """This function returns True if any record has been changed or deleted since the last save and False if not"""
+        return len(self.__dirtyRecords) > 0 or len(self.__deletedRecords) > 0
+
+    def __restoreChanges(self, savedRecords, savedDeletions):
+        """This function takes the dictionaries of changed and deleted records from a save that failed and adds them
+        back to the changes waiting to be saved. A record that has been changed or deleted again since the save started
+        keeps its newer state."""
+        for entityType in savedRecords:
+            for ID in savedRecords[entityType]:
+                if ID not in self.__deletedRecords.get(entityType, set()):
+                    self.__dirtyRecords.setdefault(entityType, set()).add(ID)
+        for entityType in savedDeletions:
+            for ID in savedDeletions[entityType]:
+                if ID not in self.__dirtyRecords.get(entityType, set()):
+                    self.__deletedRecords.setdefault(entityType, set()).add(ID)
+
+    def __newID(self, entityType):
+        """This function takes an entity type and returns a new ID for a record of that type. IDs are integers which are
+        allocated in order by the backend, so an ID is never given to two records (of any type, and by any copy of the
+        software sharing the same data) even if a record is deleted."""
+        table = self.__entities[entityType]
+        ID = None
+        # Checking the ID is not already used in case the data was changed by an older version of the software
+        while ID is None or ID in table:
+            self.__reserveIDs(1)
+            ID = self.__nextID
+            self.__nextID += 1
+        return ID
+
+    def __reserveIDs(self, count):
+        """This function takes a number of IDs and makes sure that at least that many IDs are reserved for new records.
+        If there are not enough left in the current block then a new block is allocated by the backend."""
+        # Waiting for the journal to be replayed first, as any old IDs must be converted before new IDs are allocated
+        self.__entities.wait()
+        if self.__endID - self.__nextID < count:
+            size = max(count, self.__blockSize)
+            self.__nextID = self.__backend.allocateIDs(size)
+            self.__endID = self.__nextID + size
+
+    def __migrateIDs(self):
+        """Older versions of the software used the hash of an object (as a string) as the ID of a record. This function
+        is run when the software starts and no IDs have been allocated yet. It gives every record with a string ID a new
+        integer ID (changing the foreign keys which refer to it too) and starts the backend's IDs after the largest ID
+        in use. It returns True if any records were changed."""
+        if self.__backend.hasAllocatedIDs():
+            return False
+        oldIDs = []
+        largest = 0
+        for entityType in self.__entities.keys():
+            # User accounts use their username as their ID so they are never changed
+            if entityType != "User":
+                for ID in self.__entities[entityType]:
+                    if isinstance(ID, int):
+                        largest = max(largest, ID)
+                    else:
+                        oldIDs.append(ID)
+        newIDs = {}
+        for i in range(0, len(oldIDs)):
+            newIDs[oldIDs[i]] = largest + 1 + i
+        if len(newIDs) > 0:
+            self.__applyMigrateIDs(newIDs)
+            self.__journal(["migrateIDs", newIDs])
+        """The backend's IDs are only started once the records have been changed, so if the software stops before then 
+        the records are converted again the next time it starts"""
+        self.__backend.allocateIDs(0, largest + 1 + len(oldIDs))
+        return len(newIDs) > 0
+
+    def __journal(self, entry):
+        """This function takes a list describing a change to the database and passes it to the storage backend, which
+        makes sure the change is not lost (e.g. by appending it to a journal file). During a batch the change is kept
+        until the batch has finished."""
+        if self.__batchEntries is not None:
+            self.__batchEntries.append(entry)
+        else:
+            self.__backend.record(entry)
+            # Now the change cannot be lost, the listeners are told about it
+            self.__deliver()
+
+    def __applyJournal(self):
+        """This function re-applies every change stored in the journal (in the order they were made) to the entities
+        loaded from their files. This recovers any changes made after the last save, e.g. if the software crashed. The
+        journal from a save that did not finish is replayed first as its changes came before the current journal. It
+        returns the list of changes that were re-applied."""
+        entries = self.__backend.loadJournal()
+        for entry in entries:
+            self.__applyEntry(entry)
+        # The changes were made before the software started, so the listeners are not told about them
+        self.__events = []
+        return entries
+
+    def __applyEntry(self, entry):
+        """This function takes a journal entry and makes the change it describes"""
+        actions = {"record": self.__applyRecord, "user": self.__applyUser, "relationship": self.__applyRelationship,
+                   "relationships": self.__applyRelationships, "import": self.__applyImport,
+                   "deleteOrderLines": self.__applyDeleteOrderLines, "deleteOrders": self.__applyDeleteOrders,
+                   "delete": self.__applyDelete,
+                   "deleteRecords": self.__applyDeleteRecords, "deleteRelationship": self.__applyDeleteRelationship,
+                   "migrateIDs": self.__applyMigrateIDs, "batch": self.__applyBatch}
+        # The first item of each entry is the type of change and the rest are the values needed to make it
+        actions[entry[0]](*entry[1:])
+
+    def __replayJournal(self):
+        """This function applies the journal (see __applyJournal), converts any old IDs (see __migrateIDs) and then saves
+        the recovered changes"""
+        entries = self.__applyJournal()
+        if self.__migrateIDs() or len(entries) > 0:
+            """Saving the recovered changes to the entity files so that the journal starts empty again. This also removes any 
+            half-written entry at the end of the journal."""
+            self.saveFile()
+
+    def __preload(self, entityTypes, locked):
+        """This function is run by the preload thread. It replays the journal while the database is locked, lets the
+        other threads use the records, and then loads the entity types in entityTypes in order followed by the rest, so
+        they are ready before they are needed. The event locked is set once the database has been locked."""
+        try:
+            with self.__lock.write():
+                locked.set()
+                entries = self.__applyJournal()
+                migrated = self.__migrateIDs()
+        finally:
+            self.__entities.resume()
+        # Saving the recovered changes is done once the database is unlocked, as the autosave thread may be saving too
+        if migrated or len(entries) > 0:
+            self.saveFile()
+        for entityType in list(entityTypes) + self.__entities.keys():
+            self.__entities[entityType]
+        # Filling the search indexes now, so the first search does not have to split every record into words
+        for entityType in self.__searchIndexes:
+            with self.__lock.read():
+                self.__searchIndexes[entityType].fill()
+
+    def __autosave(self, interval):
+        """This function is run by the autosave thread. Every 'interval' seconds it saves the database if it has been
+        changed since the last save."""
+        while not self.__stopAutosave.wait(interval):
+            if self.__hasChanges():
+                try:
+                    self.saveFile()
+                except OSError:
+                    # If the save fails the changes are still in the journal, so the next autosave can try again
+                    pass
+
+
+class ReadWriteLock(object):
+    """This object is a lock which can be held by any number of threads reading the database at once, or by one
+    thread changing it (writing). A thread which is writing can also read, and a thread can take the lock again while
+    it holds it (e.g. when one function of the EntityHandler calls another). Once a thread is waiting to write no new
+    threads can start reading, so a stream of searches can never stop the GUI from saving a change."""
+    def __init__(self):
+        self.__condition = threading.Condition(threading.Lock())
+        # A dictionary with the identifiers of the threads reading as keys and how many times they have read as values
+        self.__readers = {}
+        # The identifier of the thread writing (None if no thread is) and how many times it has taken the lock
+        self.__writer = None
+        self.__writes = 0
+        self.__waitingWriters = 0
+
+    @contextlib.contextmanager
+    def read(self):
+        """This function is used in a with statement to read while the with statement runs"""
+        self.acquireRead()
+        try:
+            yield
+        finally:
+            self.releaseRead()
+
+    @contextlib.contextmanager
+    def write(self):
+        """This function is used in a with statement to write while the with statement runs"""
+        self.acquireWrite()
+        try:
+            yield
+        finally:
+            self.releaseWrite()
+
+    def acquireRead(self):
+        """This function waits until the current thread can read and then takes the lock for reading"""
+        thread = threading.get_ident()
+        with self.__condition:
+            # A thread already holding the lock does not wait, otherwise it would wait for itself
+            if self.__writer != thread and thread not in self.__readers:
+                while self.__writer is not None or self.__waitingWriters > 0:
+                    self.__condition.wait()
+            self.__readers[thread] = self.__readers.get(thread, 0) + 1
+
+    def releaseRead(self):
+        """This function releases the lock taken by acquireRead"""
+        thread = threading.get_ident()
+        with self.__condition:
+            self.__readers[thread] -= 1
+            if self.__readers[thread] == 0:
+                del self.__readers[thread]
+                if len(self.__readers) == 0:
+                    self.__condition.notify_all()
+
+    def acquireWrite(self):
+        """This function waits until no other thread is reading or writing and then takes the lock for writing. A
+        RuntimeError is raised if the current thread is reading (and not writing), as it would wait for itself forever."""
+        thread = threading.get_ident()
+        with self.__condition:
+            if self.__writer == thread:
+                self.__writes += 1
+                return
+            if thread in self.__readers:
+                raise RuntimeError("The database cannot be changed by a thread which is reading it")
+            self.__waitingWriters += 1
+            try:
+                while self.__writer is not None or len(self.__readers) > 0:
+                    self.__condition.wait()
+            finally:
+                self.__waitingWriters -= 1
+            self.__writer = thread
+            self.__writes = 1
+
+    def releaseWrite(self):
+        """This function releases the lock taken by acquireWrite"""
+        with self.__condition:
+            self.__writes -= 1
+            if self.__writes == 0:
+                self.__writer = None
+                self.__condition.notify_all()
+
+
+class EntityStore(object):
+    """This object behaves like the dictionary of entities (with entity types as keys and dictionaries of records as
+    values), except that the records of each entity type are only loaded the first time that type is used. This means
+    types which are rarely used (e.g. Note) do not slow down the start of the software."""
+    def __init__(self, entityTypes, loader):
+        """The constructor takes a list of entity types and a function which takes an entity type and returns the
+        dictionary of records of that type"""
+        self.__entityTypes = entityTypes
+        self.__loader = loader
+        self.__tables = {}
+        """A dictionary with entity types as keys and a lock for each type as values, which stops two threads loading the 
+        same entity type at once. Each type has its own lock, so a thread loading one type (e.g. the preload thread 
+        loading Note) does not stop another thread loading a different type."""
+        self.__locks = {}
+        for entityType in entityTypes:
+            self.__locks[entityType] = threading.Lock()
+        # While this event is not set, only the thread in self.__owner may use the store (see pause)
+        self.__ready = threading.Event()
+        self.__ready.set()
+        self.__owner = None
+
+    def __getitem__(self, entityType):
+        """This function takes an entity type and returns the dictionary of records of that type, loading it first if it
+        has not been used before"""
+        self.wait()
+        if entityType not in self.__tables:
+            if entityType not in self.__entityTypes:
+                raise KeyError(entityType)
+            with self.__locks[entityType]:
+                # Checking again in case another thread loaded the entity type while this one was waiting for the lock
+                if entityType not in self.__tables:
+                    self.__tables[entityType] = self.__loader(entityType)
+        return self.__tables[entityType]
+
+    def __iter__(self):
+        return iter(self.__entityTypes)
+
+    def __contains__(self, entityType):
+        return entityType in self.__entityTypes
+
+    def __len__(self):
+        return len(self.__entityTypes)
+
+    def keys(self):
+        return list(self.__entityTypes)
+
+    def pause(self, owner):
+        """This function takes a thread as its input and stops any other thread using the store until resume is called.
+        It is used while the journal is replayed, so no other thread sees the records before they are up to date."""
+        self.__owner = owner
+        self.__ready.clear()
+
+    def wait(self):
+        """This function waits until the current thread is allowed to use the store (see pause)"""
+        if not self.__ready.is_set() and threading.current_thread() is not self.__owner:
+            self.__ready.wait()
+
+    def resume(self):
+        """This function lets every thread use the store again after pause"""
+        self.__owner = None
+        self.__ready.set()
+
+    def isLoaded(self, entityType):
+        """This function takes an entity type and returns True if its records have already been loaded"""
+        return entityType in self.__tables
+
+
+class Snapshot(object):
+    """This object is a copy of the records in the database at the moment it was made (see EntityHandler.snapshot). It
+    behaves like the dictionary of entities, but its records are never changed, so another thread can look through
+    them without the rest of the software changing them part way through."""
+    def __init__(self, tables):
+        """The constructor takes a dictionary with entity types as keys and read-only dictionaries of records as values"""
+        self.__tables = tables
+
+    def __getitem__(self, entityType):
+        """This function takes an entity type and returns the dictionary of copied records of that type"""
+        return self.__tables[entityType]
+
+    def __iter__(self):
+        return iter(self.__tables)
+
+    def __contains__(self, entityType):
+        return entityType in self.__tables
+
+    def __len__(self):
+        return len(self.__tables)
+
+    def keys(self):
+        return list(self.__tables.keys())
 
 
 class Searcher(object):
@@ -205,42 +1444,27 @@ class Searcher(object):
         """The constructor takes an entityHanlder as its input. It creates an empty dictionary that will be the list of
         results of a search and also gets the entities dictionary from the entityHandler it is passed."""
         self.__results = {}
+        self.__handler = entityHandler
         self.__entities = entityHandler.getEntities()
 
-    def getNotes(self, ID):
+    def getNotes(self, ID, count=None):
         """This function receives the ID of a record in the database as input (this a Person type) and returns any notes
-        which are about the record of that ID"""
-        IDList = []
-        for n in self.__entities["Note"]:
-            # Append n (the ID of the current note) to the output list if the input variable ID is its foreign key
-            if ID == self.__entities["Note"][n].getIDs():
-                IDList.append(n)
-        return IDList
+        which are about the record of that ID, newest first. If count is given only the newest count notes are returned."""
+        # Getting the IDs of the notes which have the input variable ID as their foreign key
+        return self.__handler.getNotes(ID, count)
 
     def search(self, entry, types):
         """This function takes a user text entry and list of types as its input. It returns a dictionary of results
-        containing records which may relate to the text in 'entry' and are of a type within the list 'types'."""
+        containing records which relate to the text in 'entry' (each word in it starts a word in the record's search 
+        fields) and are of a type within the list 'types'."""
         # Clearing the results dictionary
         self.__results = {}
         # Iterating through the types in the passed variable 'types'
         for atype in types:
-            IDList = []
-            for record in self.__entities[atype]:
-                # If the user did not input any text in the search bar then return all records of atype
-                if entry == "":
-                    IDList.append(record)
-                else:
-                    # Get the list of search related attributes from 'record'
-                    searchList = self.__entities[atype][record].getSearch()
-                    # Convert this list to a string with each item separated by a comma
-                    key = ' '.join(searchList)
-                    """If the lowercase version of the passed variable 'entry' is in the search related attributes, 
-                    append the ID of that record to IDList"""
-                    if entry.lower() in key.lower():
-                        IDList.append(record)
             """Create an entry in the results dictionary with key of 'atype' and value of the list of matching record 
-            IDs for that type"""
-            self.__results[atype] = IDList
+            IDs for that type. If the user did not input any text in the search bar then every record of atype is 
+            included."""
+            self.__results[atype] = self.__handler.search(atype, entry)
         return self.__results
 
     def getView(self, type, ID):
@@ -249,15 +1473,17 @@ class Searcher(object):
         output = ""
         # If the type is UniformOrder get and return the list of view attributes as this will be handled separately
         if type == "UniformOrder":
-            return self.__entities[type][ID].getView()
+            with self.__handler.reading():
+                return self.__entities[type][ID].getView()
         # If the type is a User then return the ID (username) of that user
         elif type == "User":
             return ID
         else:
             """Get the list of attributes to identify the record of type 'type' matching ID and convert them to a string 
             with each value separated by a comma. Return this string with any excess spaces stripped."""
-            for part in self.__entities[type][ID].getView():
-                output += part + " "
+            with self.__handler.reading():
+                for part in self.__entities[type][ID].getView():
+                    output += part + " "
             return output.strip(" ")
 
 
@@ -1,14 +1,36 @@
 import pickle
+import zlib
+import lzma
+import threading
+import time
 import os
+# File locking is done differently on Windows (msvcrt) and other operating systems (fcntl)
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
 
 
 class FileManager(object):
     """"This class acts as an interface for the rest of my code to access the contents of any pickled files"""
     def saveFile(self, filename, data):
         """"This function takes a filename and some data to store in a file and does so in a pickled form"""
-        file = open(filename, 'wb')
-        pickle.dump(data, file)
+        self.saveBytes(filename, pickle.dumps(data))
+
+    def saveBytes(self, filename, data):
+        """This function takes a filename and some bytes and writes them to that file. The bytes are written to a
+        temporary file first which then replaces the original, so a crash part way through saving never leaves a
+        half-written file behind."""
+        tempName = filename + ".tmp"
+        file = open(tempName, 'wb')
+        file.write(data)
+        # Making sure the data has physically been written to the disk before the temporary file replaces the original
+        file.flush()
+        os.fsync(file.fileno())
         file.close()
+        # Renaming is atomic, so filename will either contain the old data or the new data in full
+        os.replace(tempName, filename)
 
     def loadFile(self, filename):
         """The function takes a filename and attempts to return the contents of that file, if no such file is found then
@@ -21,3 +43,183 @@ class FileManager(object):
             return data
         else:
             raise FileNotFoundError
+
+    def loadBytes(self, filename):
+        """This function takes a filename and returns the bytes in that file. If no such file is found then a
+        FileNotFoundError is raised."""
+        if os.path.exists(filename):
+            file = open(filename, 'rb')
+            data = file.read()
+            file.close()
+            return data
+        else:
+            raise FileNotFoundError
+
+    def appendFile(self, filename, data):
+        """This function takes a filename and some data and adds the data to the end of the file in a pickled form. Nothing
+        that is already in the file is rewritten, so the cost only depends on the size of data."""
+        file = open(filename, 'ab')
+        pickle.dump(data, file)
+        file.close()
+
+    def loadRecords(self, filename):
+        """This function takes a filename and returns a list of every item that has been appended to that file. If there
+        is no such file then an empty list is returned."""
+        records = []
+        if os.path.exists(filename):
+            file = open(filename, 'rb')
+            while True:
+                try:
+                    records.append(pickle.load(file))
+                except (EOFError, pickle.UnpicklingError):
+                    """Stop at the end of the file. An item that was only partly written (e.g. the software crashed while 
+                    appending it) is also treated as the end of the file."""
+                    break
+            file.close()
+        return records
+
+    def renameFile(self, filename, newName):
+        """This function takes a filename and a new name and renames that file (replacing any file called newName) if it
+        exists"""
+        if os.path.exists(filename):
+            os.replace(filename, newName)
+
+    def fileExists(self, filename):
+        """This function takes a filename and returns True if that file exists and False if not"""
+        return os.path.exists(filename)
+
+    def deleteFile(self, filename):
+        """This function takes a filename and deletes that file if it exists"""
+        if os.path.exists(filename):
+            os.remove(filename)
+
+
+class SnapshotCodec(object):
+    """This class converts a snapshot of a table of records to and from bytes. A snapshot is the list of the names of
+    the fields of the records, a list of rows, where each row is a tuple of an ID followed by the values of that
+    record's fields, and a list of the IDs of deleted records (which is only used by delta snapshots, see
+    PickleBackend). As only plain values are stored (rather than whole objects) a snapshot can still be loaded after
+    the classes of the records have been changed.
+
+    The bytes start with a header - MAGIC, the version of the format, the compression used and the compression level -
+    so files from older versions of the software (which do not start with MAGIC) can be recognised and migrated."""
+    MAGIC = b"NEASNAP"
+    # The version of the format written by this class. This must be increased whenever the format is changed.
+    VERSION = 2
+    # The number stored in the header for each type of compression
+    COMPRESSIONS = {None: 0, "zlib": 1, "lzma": 2}
+
+    def __init__(self, compression=None, level=6):
+        """The constructor takes the type of compression to use when encoding ("zlib", "lzma" or None for no
+        compression) and the compression level (0-9, higher levels give smaller files but take longer)"""
+        if compression not in self.COMPRESSIONS:
+            raise ValueError("Unknown compression: " + str(compression))
+        self.__compression = compression
+        self.__level = level
+
+    def isSnapshot(self, data):
+        """This function takes some bytes and returns True if they were written by this class and False if not"""
+        return data[:len(self.MAGIC)] == self.MAGIC
+
+    def encode(self, fields, rows, deleted=()):
+        """This function takes a list of field names, a list of rows and a list of deleted IDs and returns them as bytes
+        with a header"""
+        payload = pickle.dumps((fields, rows, list(deleted)), pickle.HIGHEST_PROTOCOL)
+        if self.__compression == "zlib":
+            payload = zlib.compress(payload, self.__level)
+        elif self.__compression == "lzma":
+            payload = lzma.compress(payload, preset=self.__level)
+        header = self.MAGIC + bytes([self.VERSION, self.COMPRESSIONS[self.__compression], self.__level])
+        return header + payload
+
+    def decode(self, data):
+        """This function takes some bytes returned by encode and returns the list of field names, the list of rows and
+        the list of deleted IDs. The compression is read from the header, so it does not matter which compression this codec was created
+        with."""
+        if not self.isSnapshot(data):
+            raise ValueError("The data is not a snapshot")
+        start = len(self.MAGIC)
+        version = data[start]
+        compression = data[start + 1]
+        if version > self.VERSION:
+            raise ValueError("The snapshot was written by a newer version of the software (format " + str(version) +
+                             ")")
+        payload = data[start + 3:]
+        if compression == self.COMPRESSIONS["zlib"]:
+            payload = zlib.decompress(payload)
+        elif compression == self.COMPRESSIONS["lzma"]:
+            payload = lzma.decompress(payload)
+        if version == 1:
+            # Version 1 snapshots did not store any deleted IDs
+            fields, rows = pickle.loads(payload)
+            deleted = []
+        else:
+            fields, rows, deleted = pickle.loads(payload)
+        return fields, rows, deleted
+
+
+class FileLock(object):
+    """This class is an advisory lock on a file which is shared between processes, e.g. two copies of the software
+    running on different computers against the same data directory. Only one process can hold the lock at a time. The
+    lock can be acquired again by the thread already holding it, and must then be released the same number of times."""
+    def __init__(self, filename):
+        """The constructor takes the name of the file to lock as its input. The file is created if it does not exist."""
+        self.__filename = filename
+        self.__file = None
+        # The number of times the lock has been acquired by the thread holding it
+        self.__count = 0
+        # The lock is also shared by the threads of this process, so only one of them can hold it at a time
+        self.__threadLock = threading.RLock()
+
+    def acquire(self, blocking=True):
+        """This function acquires the lock. If blocking is True it waits until the lock is free, otherwise it returns
+        False straight away if another process holds the lock. It returns True once the lock has been acquired."""
+        if not self.__threadLock.acquire(blocking):
+            return False
+        if self.__count == 0:
+            self.__file = open(self.__filename, 'a+b')
+            while not self.__lockFile():
+                if not blocking:
+                    self.__file.close()
+                    self.__file = None
+                    self.__threadLock.release()
+                    return False
+                time.sleep(0.05)
+        self.__count += 1
+        return True
+
+    def release(self):
+        """This function releases the lock once it has been released as many times as it was acquired"""
+        self.__count -= 1
+        if self.__count == 0:
+            self.__unlockFile()
+            self.__file.close()
+            self.__file = None
+        self.__threadLock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.release()
+
+    def __lockFile(self):
+        """This function attempts to lock the open file without waiting and returns True if it succeeded"""
+        try:
+            if fcntl is not None:
+                fcntl.flock(self.__file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                # msvcrt locks a range of bytes, so the first byte of the file is used as the lock
+                self.__file.seek(0)
+                msvcrt.locking(self.__file.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def __unlockFile(self):
+        if fcntl is not None:
+            fcntl.flock(self.__file.fileno(), fcntl.LOCK_UN)
+        else:
+            self.__file.seek(0)
+            msvcrt.locking(self.__file.fileno(), msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,525 @@
+import bisect
+import datetime
+import re
+import threading
+
+# The pattern matching a word in the search fields of a record (see TokenIndex)
+wordPattern = re.compile(r"\w+")
+
+
+class AdjacencyIndex(object):
+    """This class is an index of the records of one relationship type (e.g. StudentClass). For each record linked by the
+    relationship it stores the relationships it is part of and the records at the other end of them, in both
+    directions - from the parent (e.g. a class) to its children (e.g. its students) and from a child to its parents. This
+    means the links of one record can be found without looking through every relationship.
+
+    It also stores every (parent ID, child ID) pair that is linked, so whether two records are already linked can be
+    checked in constant time."""
+    def __init__(self):
+        # Dictionaries with record IDs as keys and dictionaries of {relationship ID: ID of the record at the other end}
+        self.__forward = {}
+        self.__reverse = {}
+        # A dictionary with (parent ID, child ID) tuples as keys and the IDs of the relationship records as values
+        self.__pairs = {}
+
+    def build(self, table):
+        """This function takes a dictionary of relationship records and replaces the contents of the index with them. It
+        is used when the records are loaded."""
+        self.__forward = {}
+        self.__reverse = {}
+        self.__pairs = {}
+        for recordID in table:
+            row = table[recordID].exportRow()
+            self.add(recordID, row[0], row[1])
+
+    def add(self, recordID, parentID, childID):
+        """This function takes the ID of a relationship record and the IDs of the parent and child it links and adds it
+        to the index"""
+        self.__forward.setdefault(parentID, {})[recordID] = childID
+        self.__reverse.setdefault(childID, {})[recordID] = parentID
+        self.__pairs[(parentID, childID)] = recordID
+
+    def remove(self, recordID, parentID, childID):
+        """This function takes the ID of a relationship record and the IDs of the parent and child it links and removes
+        it from the index"""
+        # Only removing the pair if it belongs to this record (another record may link the same pair)
+        if self.__pairs.get((parentID, childID)) == recordID:
+            del self.__pairs[(parentID, childID)]
+        for links, ID in [[self.__forward, parentID], [self.__reverse, childID]]:
+            if ID in links:
+                links[ID].pop(recordID, None)
+                # Removing the record from the index completely once it has no links left
+                if len(links[ID]) == 0:
+                    del links[ID]
+
+    def foreigns(self, ID):
+        """This function takes the ID of a record and returns a list of [relationship ID, ID of the other record] pairs
+        for every relationship the record is part of (in the same form as EntityHandler.getForeigns)"""
+        output = []
+        # The dictionaries are copied into lists first in case another thread changes them
+        for links in [self.__reverse.get(ID, {}), self.__forward.get(ID, {})]:
+            for recordID, otherID in list(links.items()):
+                output.append([recordID, otherID])
+        return output
+
+    def references(self, ID):
+        """This function takes the ID of a record and returns the IDs of the relationship records it is part of"""
+        output = []
+        for recordID, otherID in self.foreigns(ID):
+            if recordID not in output:
+                output.append(recordID)
+        return output
+
+    def count(self, ID):
+        """This function takes the ID of a record and returns the number of relationship records it is part of. The
+        dictionaries of links already hold one entry per relationship, so nothing needs to be counted."""
+        return len(self.__forward.get(ID, {})) + len(self.__reverse.get(ID, {}))
+
+    def find(self, parentID, childID):
+        """This function takes the IDs of a parent and a child and returns the ID of the relationship record linking
+        them, or None if they are not linked. The IDs may be given either way round."""
+        recordID = self.__pairs.get((parentID, childID))
+        if recordID is None:
+            recordID = self.__pairs.get((childID, parentID))
+        return recordID
+
+
+class ReferenceIndex(object):
+    """This class is an index of the foreign keys of one entity type (e.g. the recordID of a Note). For each ID used as a
+    foreign key it stores the IDs of the records which contain it, so the records referring to another record (e.g. the
+    notes about a student) can be found without looking through every record of the type.
+
+    The IDs for each foreign key are kept sorted by the field at orderPosition (e.g. the dateCreated of a Note), or by
+    the order they were added in if no orderPosition is given."""
+    def __init__(self, positions, orderPosition=None):
+        """The constructor takes the indexes of the foreign keys in a row from exportRow as its input, along with the
+        index of the field to sort the records by"""
+        self.__positions = positions
+        self.__orderPosition = orderPosition
+        """A dictionary with foreign key values as keys and sorted lists of (order, recordID) tuples as values, where
+        order is the value of the field the records are sorted by"""
+        self.__references = {}
+        # A dictionary with record IDs as keys and (foreign key values, order) tuples as values
+        self.__keys = {}
+        # A count of the records added, used as the order when there is no field to sort by
+        self.__added = 0
+
+    def build(self, table):
+        """This function takes a dictionary of records and replaces the contents of the index with them"""
+        self.__references = {}
+        self.__keys = {}
+        self.__added = 0
+        for recordID in table:
+            self.add(recordID, table[recordID])
+
+    def add(self, recordID, record):
+        """This function takes the ID of a record and the record and adds its foreign keys to the index. If the record is
+        already in the index its old foreign keys are removed first, as they may have been changed."""
+        self.remove(recordID)
+        row = record.exportRow()
+        keys = []
+        for position in self.__positions:
+            if row[position] not in keys:
+                keys.append(row[position])
+        if self.__orderPosition is None:
+            order = self.__added
+        else:
+            order = row[self.__orderPosition]
+        self.__added += 1
+        for key in keys:
+            bisect.insort(self.__references.setdefault(key, []), (order, recordID))
+        self.__keys[recordID] = (keys, order)
+
+    def remove(self, recordID):
+        """This function takes the ID of a record and removes its foreign keys from the index"""
+        if recordID not in self.__keys:
+            return
+        keys, order = self.__keys.pop(recordID)
+        for key in keys:
+            references = self.__references.get(key, [])
+            # Finding the record with a binary search, as the list is sorted
+            position = bisect.bisect_left(references, (order, recordID))
+            if position < len(references) and references[position] == (order, recordID):
+                references.pop(position)
+            if len(references) == 0:
+                self.__references.pop(key, None)
+
+    def references(self, ID):
+        """This function takes an ID and returns a list of the IDs of the records which contain it as a foreign key, in
+        ascending order"""
+        IDs = []
+        for order, recordID in self.__references.get(ID, []):
+            IDs.append(recordID)
+        return IDs
+
+    def newest(self, ID, count=None):
+        """This function takes an ID and a number of records and returns a list of the IDs of the last count records
+        (or all of them if count is None) which contain ID as a foreign key, starting with the last. Only the records
+        returned are looked at."""
+        references = self.__references.get(ID, [])
+        if count is None or count > len(references):
+            count = len(references)
+        IDs = []
+        for index in range(len(references) - 1, len(references) - 1 - count, -1):
+            IDs.append(references[index][1])
+        return IDs
+
+
+class WeekdayIndex(object):
+    """This class is an index of the records of a type which take place on a day of the week (e.g. Class). For each day
+    of the week it stores the IDs of the records which take place on it."""
+    days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+    def __init__(self, dayPosition):
+        """The constructor takes the index of the day of the week in a row from exportRow as its input"""
+        self.__dayPosition = dayPosition
+        # A list with a dictionary of {record ID: None} for each day of the week, starting with Monday
+        self.__records = [{} for day in self.days]
+        # A dictionary with record IDs as keys and the day of the week (as an integer) of the record as values
+        self.__recordDays = {}
+
+    def build(self, table):
+        """This function takes a dictionary of records and replaces the contents of the index with them"""
+        self.__records = [{} for day in self.days]
+        self.__recordDays = {}
+        for recordID in table:
+            self.add(recordID, table[recordID])
+
+    def add(self, recordID, record):
+        """This function takes the ID of a record and the record and adds it to the index (replacing its old day)"""
+        self.remove(recordID)
+        day = record.exportRow()[self.__dayPosition]
+        # Records without a valid day of the week are not indexed, as they never take place
+        if day in self.days:
+            weekday = self.days.index(day)
+            self.__records[weekday][recordID] = None
+            self.__recordDays[recordID] = weekday
+
+    def remove(self, recordID):
+        """This function takes the ID of a record and removes it from the index"""
+        if recordID in self.__recordDays:
+            del self.__records[self.__recordDays.pop(recordID)][recordID]
+
+    def on(self, weekday):
+        """This function takes a day of the week as an integer (0 is Monday, as with date.weekday) and returns a list of
+        the IDs of the records which take place on it"""
+        return list(self.__records[weekday])
+
+    def between(self, start, end):
+        """This function takes two dates and returns a list of the IDs of the records which take place on at least one
+        day between them (inclusive)"""
+        weekdays = []
+        day = start
+        # Only the first week of the range needs to be looked at, as every day after that repeats
+        while day <= end and len(weekdays) < 7:
+            weekdays.append(day.weekday())
+            day += datetime.timedelta(days=1)
+        IDs = []
+        for weekday in sorted(weekdays):
+            IDs.extend(self.__records[weekday])
+        return IDs
+
+
+class IntervalIndex(object):
+    """This class is an index of the records of a type which take place between a start and an end date (e.g. Event).
+    The records are kept in a list sorted by their start date, so the records starting in a range of dates can be found
+    with a binary search. The longest time any record lasts is also stored, so the records which are still running on a
+    date can be found by only looking at the records which started less than that long before it."""
+    def __init__(self, startPosition, endPosition):
+        """The constructor takes the indexes of the start and end date in a row from exportRow as its input"""
+        self.__startPosition = startPosition
+        self.__endPosition = endPosition
+        # A list of (start date, record ID) tuples sorted by start date
+        self.__starts = []
+        # A dictionary with record IDs as keys and (start date, end date) tuples as values
+        self.__dates = {}
+        # The longest time between the start and end date of any record that has been added
+        self.__longest = datetime.timedelta(0)
+
+    def build(self, table):
+        """This function takes a dictionary of records and replaces the contents of the index with them"""
+        self.__dates = {}
+        self.__longest = datetime.timedelta(0)
+        self.__starts = []
+        for recordID in table:
+            self.add(recordID, table[recordID])
+
+    def add(self, recordID, record):
+        """This function takes the ID of a record and the record and adds it to the index (replacing its old dates)"""
+        self.remove(recordID)
+        row = record.exportRow()
+        start = self.__toDate(row[self.__startPosition])
+        end = self.__toDate(row[self.__endPosition])
+        # Records without a start date are not indexed, and a record without an end date only lasts one day
+        if start is None:
+            return
+        if end is None or end < start:
+            end = start
+        bisect.insort(self.__starts, (start, recordID))
+        self.__dates[recordID] = (start, end)
+        if end - start > self.__longest:
+            self.__longest = end - start
+
+    def remove(self, recordID):
+        """This function takes the ID of a record and removes it from the index. The longest time a record lasts is not
+        reduced, as a value which is too large only means more records are looked at."""
+        if recordID in self.__dates:
+            start, end = self.__dates.pop(recordID)
+            position = bisect.bisect_left(self.__starts, (start, recordID))
+            if position < len(self.__starts) and self.__starts[position] == (start, recordID):
+                self.__starts.pop(position)
+
+    def starting(self, start, end):
+        """This function takes two dates and returns a list of the IDs of the records which start between them
+        (inclusive), in order of their start date"""
+        IDs = []
+        for date, recordID in self.__starts[self.__first(start):self.__after(end)]:
+            IDs.append(recordID)
+        return IDs
+
+    def between(self, start, end):
+        """This function takes two dates and returns a list of the IDs of the records which are running on at least one
+        day between them (inclusive), in order of their start date"""
+        start = self.__toDate(start)
+        IDs = []
+        # A record running on start must have started less than the longest time a record lasts before it
+        for date, recordID in self.__starts[self.__first(start - self.__longest):self.__after(end)]:
+            if self.__dates[recordID][1] >= start:
+                IDs.append(recordID)
+        return IDs
+
+    def upcoming(self, date, count):
+        """This function takes a date and a number of records and returns a list of the IDs of the first count records
+        starting on or after the date, in order of their start date"""
+        IDs = []
+        position = self.__first(date)
+        for date, recordID in self.__starts[position:position + count]:
+            IDs.append(recordID)
+        return IDs
+
+    def __first(self, date):
+        """This function takes a date and returns the position of the first record in the list starting on or after it"""
+        # A tuple containing only the date comes before any (date, ID) tuple with the same date
+        return bisect.bisect_left(self.__starts, (self.__toDate(date),))
+
+    def __after(self, date):
+        """This function takes a date and returns the position of the first record in the list starting after it"""
+        return bisect.bisect_left(self.__starts, (self.__toDate(date) + datetime.timedelta(days=1),))
+
+    def __toDate(self, value):
+        """This function takes a date (or a datetime, in which case the time is removed) and returns it as a date, so
+        that the dates of different records can be compared"""
+        if isinstance(value, datetime.datetime):
+            return value.date()
+        return value
+
+
+class FieldIndex(object):
+    """This class is an index of the values of one field of an entity type (e.g. the email of a Student). For each value
+    it stores the IDs of the records with that value, so records can be looked up by the field without looking through
+    every record. Strings are compared ignoring case and any spaces at either end, so "Smith " finds "smith"."""
+    def __init__(self, position, unique=False):
+        """The constructor takes the index of the field in a row from exportRow as its input, along with whether each
+        value of the field should only be used by one record"""
+        self.__position = position
+        self.__unique = unique
+        # A dictionary with values as keys and dictionaries of {record ID: None} (in the order they were added) as values
+        self.__records = {}
+        # A dictionary with record IDs as keys and the value of the field in each record as values
+        self.__values = {}
+
+    def isUnique(self):
+        return self.__unique
+
+    def build(self, table):
+        """This function takes a dictionary of records and replaces the contents of the index with them"""
+        self.__records = {}
+        self.__values = {}
+        for recordID in table:
+            self.add(recordID, table[recordID])
+
+    def add(self, recordID, record):
+        """This function takes the ID of a record and the record and adds it to the index (replacing its old value)"""
+        self.remove(recordID)
+        value = self.__key(record.exportRow()[self.__position])
+        self.__records.setdefault(value, {})[recordID] = None
+        self.__values[recordID] = value
+
+    def remove(self, recordID):
+        """This function takes the ID of a record and removes it from the index"""
+        if recordID in self.__values:
+            value = self.__values.pop(recordID)
+            del self.__records[value][recordID]
+            if len(self.__records[value]) == 0:
+                del self.__records[value]
+
+    def lookup(self, value):
+        """This function takes a value and returns a list of the IDs of the records with that value in the field"""
+        return list(self.__records.get(self.__key(value), {}))
+
+    def __key(self, value):
+        """This function takes a value of the field and returns the form it is stored in the index in"""
+        if isinstance(value, str):
+            return value.strip().lower()
+        # Lists (e.g. the colours of a UniformType) cannot be dictionary keys so they are stored as tuples
+        if isinstance(value, list):
+            return tuple(value)
+        return value
+
+
+class TokenIndex(object):
+    """This class is an index of the words in the search fields of an entity type (see getSearch in the entities
+    module). For each word it stores the IDs of the records containing it, and it keeps a sorted list of the words, so
+    the words starting with part of a word (e.g. "smi") are next to each other in the list and can be found using a
+    binary search. This means the records matching a search can be found without looking through every record. Words
+    are compared ignoring case, and anything other than a letter or number separates two words (so
+    "anne.smith@mail.com" contains the words anne, smith, mail and com).
+
+    Splitting every record into words takes much longer than loading the records, so the index is not filled when the
+    records are loaded, but the first time it is searched (or by the thread preloading the database, see fill). Until
+    then add and remove do nothing, as the records are read from the table when the index is filled."""
+    def __init__(self):
+        # A dictionary with words as keys and sets of the IDs of the records containing them as values
+        self.__records = {}
+        # The list of the words in self.__records in alphabetical order
+        self.__words = []
+        # A dictionary with record IDs as keys and a tuple of the words in each record as values
+        self.__recordWords = {}
+        # The dictionary of records to fill the index from when it is first searched (None once it has been filled)
+        self.__table = None
+        # This lock stops two threads filling the index at once
+        self.__fillLock = threading.Lock()
+
+    def build(self, table):
+        """This function takes a dictionary of records and replaces the contents of the index with them. The index is
+        filled from the dictionary when it is first searched."""
+        self.__table = table
+        self.__records = {}
+        self.__words = []
+        self.__recordWords = {}
+
+    def add(self, recordID, record):
+        """This function takes the ID of a record and the record and adds it to the index (replacing its old words)"""
+        if self.__table is not None:
+            return
+        self.remove(recordID)
+        words = self.__recordWordsOf(record)
+        for word in words:
+            if word not in self.__records:
+                self.__records[word] = set()
+                bisect.insort(self.__words, word)
+            self.__records[word].add(recordID)
+        self.__recordWords[recordID] = words
+
+    def remove(self, recordID):
+        """This function takes the ID of a record and removes it from the index"""
+        if self.__table is None and recordID in self.__recordWords:
+            for word in self.__recordWords.pop(recordID):
+                self.__records[word].discard(recordID)
+                if len(self.__records[word]) == 0:
+                    del self.__records[word]
+                    del self.__words[bisect.bisect_left(self.__words, word)]
+
+    def search(self, entry):
+        """This function takes a search entry and returns a set of the IDs of the records which have a word starting
+        with each word in the entry (e.g. "ann smi" finds Anne Smith), or None if the entry does not contain any words.
+        The records found by the word in the entry matching the fewest records are looked up in the index and then
+        checked for the other words, so the time taken depends on the number of records found rather than the number
+        of records in the index."""
+        words = self.words(entry)
+        if len(words) == 0:
+            return None
+        self.fill()
+        ranges = []
+        for word in set(words):
+            # The words starting with word are those from word up to (but not including) word with its last letter increased
+            start = bisect.bisect_left(self.__words, word)
+            end = bisect.bisect_left(self.__words, word[:-1] + chr(ord(word[-1]) + 1))
+            if start == end:
+                return set()
+            size = 0
+            for i in range(start, end):
+                size += len(self.__records[self.__words[i]])
+            ranges.append([size, word, start, end])
+        ranges.sort()
+        size, word, start, end = ranges[0]
+        IDs = set()
+        for i in range(start, end):
+            IDs |= self.__records[self.__words[i]]
+        # Checking the words of each record found for the other words, rather than joining their (larger) sets of IDs
+        for size, word, start, end in ranges[1:]:
+            matching = set()
+            for ID in IDs:
+                for recordWord in self.__recordWords[ID]:
+                    if recordWord.startswith(word):
+                        matching.add(ID)
+                        break
+            IDs = matching
+        return IDs
+
+    def fill(self):
+        """This function fills the index with the records in the table passed to build, if it has not been filled yet.
+        It is called by search, and can be called by a background thread so the index is ready before it is first
+        searched. It must not be called while the records are being changed."""
+        with self.__fillLock:
+            if self.__table is not None:
+                self.__fillFrom(self.__table)
+
+    def __fillFrom(self, table):
+        """This function takes the dictionary of records passed to build and fills the index with them"""
+        records = {}
+        recordWords = {}
+        for recordID in table:
+            words = self.__recordWordsOf(table[recordID])
+            for word in words:
+                IDs = records.get(word)
+                if IDs is None:
+                    records[word] = {recordID}
+                else:
+                    IDs.add(recordID)
+            recordWords[recordID] = words
+        self.__records = records
+        # The words are only sorted once, rather than each one being put in its place as it is added
+        self.__words = sorted(records)
+        self.__recordWords = recordWords
+        self.__table = None
+
+    def __recordWordsOf(self, record):
+        """This function takes a record and returns a tuple of the different words in its search fields"""
+        values = record.getSearch()
+        try:
+            text = " ".join(values)
+        except TypeError:
+            # Some search fields are not strings (e.g. the ID of the student an order is for) or have no value
+            strings = []
+            for value in values:
+                if value is not None:
+                    strings.append(str(value))
+            text = " ".join(strings)
+        return tuple(set(wordPattern.findall(text.lower())))
+
+    def matches(self, record, words):
+        """This function takes a record and the list of words in a search entry and returns True if the record would be
+        found by search. It is used to search records which have not been indexed."""
+        values = []
+        for value in record.getSearch():
+            if value is not None:
+                values.append(str(value))
+        text = " ".join(values).lower()
+        # Most records do not contain the words at all, so this is checked before the record is split into words
+        for word in words:
+            if word not in text:
+                return False
+        recordWords = self.words(text)
+        for word in words:
+            found = False
+            for recordWord in recordWords:
+                if recordWord.startswith(word):
+                    found = True
+            if not found:
+                return False
+        return True
+
+    def words(self, text):
+        """This function takes a string and returns a list of the words in it in lower case"""
+        return wordPattern.findall(text.lower())
@@ -29,19 +29,20 @@ class PasswordManager(object):
     def __init__(self, handler):
         # This constructor takes the entityHandler as its input and stores it as a private variable
         self.__handler = handler
-        """Creating a private variable containing a dictionary of all the usernames in the system and their User object,
-        as found by a call to an entityHandler function"""
-        self.__passwords = self.__handler.getUsers()
 
     def loginCheck(self, username, password):
         """This function takes a username and a password and determines if they are both valid. If there is any invalid
         data at any point, a relevant exception is raised. If the input is valid it returns the variable username passed
         to it.
 
+        The dictionary of all the usernames in the system and their User object is only fetched from the entityHandler
+        now, so that creating a PasswordManager never has to wait for the database to load.
+
         This if statement checks that the username exists"""
-        if username in self.__passwords.keys():
+        passwords = self.__handler.getUsers()
+        if username in passwords:
             # Getting the password relating to the inputted username if it exists (by using username as dictionary key)
-            storedPassword = self.__passwords[username].getPassword()
+            storedPassword = passwords[username].getPassword()
             """ Using bcrypt to check if the stored password hash matches a hash of the inputted password -> i.e. checking 
             if the password is correct"""
             if storedPassword == bcrypt.hashpw(password.encode('utf8'), storedPassword):
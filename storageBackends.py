@@ -0,0 +1,641 @@
+import fileManagement
+import entities
+import pickle
+import sqlite3
+import uuid
+import os
+
+
+class StorageBackend(object):
+    """This class is the parent of all the storage backends. A storage backend is used by the EntityHandler to load and
+    save the records in the database, so the EntityHandler does not need to know how (or where) they are stored. Each
+    function here must be provided by a child class."""
+    """True if the backend keeps every loaded record in memory and they are only changed through the EntityHandler (or 
+    after the reload listener is called), so the EntityHandler can keep its own indexes of them"""
+    inMemory = False
+
+    def setReloadListener(self, listener):
+        """This function takes a function which is called with an entity type whenever the backend replaces the records
+        of that type (e.g. after merging the changes saved by another copy of the software)"""
+        pass
+
+    def loadTable(self, entityType):
+        """This function takes an entity type and returns an object which behaves like a dictionary of the records of
+        that type, with record IDs as keys and entity objects as values"""
+        raise NotImplementedError
+
+    def findReferences(self, entityType, ID):
+        """This function takes an entity type and an ID and returns a list of the IDs of the records of that type which
+        contain ID as one of their foreign keys"""
+        raise NotImplementedError
+
+    def record(self, entry):
+        """This function takes a list describing a change that has just been made to the database (see the EntityHandler
+        for the format) and makes sure the change will not be lost if the software crashes"""
+        raise NotImplementedError
+
+    def loadJournal(self):
+        """This function returns a list of the changes recorded since the last save which still need to be re-applied
+        to the records when the software starts (e.g. after a crash)"""
+        raise NotImplementedError
+
+    def prepareSave(self, changed, deleted):
+        """This function takes two dictionaries with entity types as keys and sets of IDs as values - the records which
+        have been created or changed and the records which have been deleted since the last save. It is called while
+        the database is locked and should do as little as possible - it returns an object that is passed to writeSave."""
+        raise NotImplementedError
+
+    def writeSave(self, prepared):
+        """This function takes the object returned by prepareSave and writes the save. It is called once the database
+        has been unlocked again, so it can be slow without stopping the rest of the software."""
+        raise NotImplementedError
+
+    def hasAllocatedIDs(self):
+        """This function returns True if allocateIDs has ever been called for this data and False if not"""
+        raise NotImplementedError
+
+    def allocateIDs(self, count, first=1):
+        """This function takes a number of IDs and returns the first of that many consecutive integer IDs which have
+        never been returned before (by this or any other copy of the software using the same data). If no IDs have been
+        allocated yet then the IDs start from first."""
+        raise NotImplementedError
+
+    def getConflicts(self):
+        """This function returns (and forgets) the list of [entityType, ID] pairs of the records whose changes could not
+        be saved because another copy of the software using the same data saved a change to them first"""
+        return []
+
+    def close(self):
+        """This function is called when the software closes and releases anything the backend has open"""
+        pass
+
+
+class PickleBackend(StorageBackend):
+    """This storage backend keeps every record in memory and stores each entity type in its own snapshot file in a
+    directory (e.g. entityData/Student.p). Every change is also appended to a journal file so that it is not lost if
+    the software crashes before the next save.
+
+    A save does not rewrite the whole snapshot (the base) of a type. Instead the records changed and deleted since the
+    base was written are stored in a smaller delta file (e.g. entityData/Student.delta.p), which is applied on top of
+    the base when the type is loaded. Once the delta grows too large compared to the table, the base is rewritten and
+    the delta is removed (compaction).
+
+    Several copies of the software (e.g. on different desks) can use the same directory at once. Each copy has its own
+    journal, and the files of the entity types are only read or written while holding a lock shared by every copy. Each
+    record is saved with a version number which goes up every time it is saved. If another copy has saved an entity type
+    since this copy loaded it, its changes are merged in when this copy saves that type. A record which was changed by
+    both copies is a conflict - the version that was saved first is kept and the record is reported (see
+    getConflicts)."""
+    inMemory = True
+
+    def __init__(self, directory="entityData", compression=None, level=6, compactRatio=0.25):
+        """The constructor takes the name of the directory the files are stored in, the compression to use for the
+        snapshot files ("zlib", "lzma" or None), the compression level and the size of a delta (as a fraction of the
+        number of records of its type) above which the base snapshot is rewritten as its inputs"""
+        # Creating an instance of a FileManager
+        self.__fM = fileManagement.FileManager()
+        # The codec converts tables of records to and from the bytes stored in the snapshot files
+        self.__codec = fileManagement.SnapshotCodec(compression, level)
+        self.__directory = directory
+        # A dictionary of every table that has been loaded, with entity types as keys
+        self.__tables = {}
+        self.__compactRatio = compactRatio
+        """A dictionary with entity types as keys and a pair of sets as values - the IDs of the records which have been 
+        changed and the IDs of the records which have been deleted since the base snapshot of that type was written. 
+        These are the records stored in the delta file."""
+        self.__deltas = {}
+        # A dictionary with entity types as keys and dictionaries of the saved version number of each record as values
+        self.__versions = {}
+        """A dictionary with entity types as keys and the generation of the files of that type when this copy of the 
+        software last read or wrote them. A type is given a new generation (a random string, stored in the generations 
+        file) every time it is saved, so if it has changed then another copy has saved the type."""
+        self.__stamps = {}
+        self.__generationsName = os.path.join(self.__directory, "generations.p")
+        # The file storing the next ID to be allocated (see allocateIDs)
+        self.__idsName = os.path.join(self.__directory, "ids.p")
+        # The list of [entityType, ID] pairs of the records which have been changed by two copies of the software
+        self.__conflicts = []
+        self.__reloadListener = None
+        if not self.__fM.fileExists(self.__directory):
+            self.__createDirectory()
+        # This lock is held by a copy of the software whenever it reads or writes the files of the entity types
+        self.__directoryLock = fileManagement.FileLock(os.path.join(self.__directory, "directory.lock"))
+        """Every copy of the software has a unique name for its journal. It holds a lock on a file with the same name for 
+        as long as it is running, so other copies can tell whether the journal is still in use."""
+        self.__name = str(os.getpid()) + "-" + uuid.uuid4().hex[:8]
+        self.__instanceLock = fileManagement.FileLock(self.__instanceLockName(self.__name))
+        self.__instanceLock.acquire()
+        # The journal file stores every change made to the database since it was last saved
+        self.__journalName = self.__journalFile(self.__name)
+        # While the database is being saved, the journal being saved is moved to this file and a new journal is started
+        self.__savingJournalName = self.__savingJournalFile(self.__name)
+        # Taking over the journals of any copies of the software which stopped without saving (e.g. they crashed)
+        self.__adoptJournals()
+
+    def loadTable(self, entityType):
+        """This function takes an entity type and returns the dictionary of records of that type from its local files.
+        If the files cannot be found then an empty dictionary is returned."""
+        with self.__directoryLock:
+            table, versions, deltaChanged, deltaDeleted = self.__readTable(entityType)
+            self.__stamps[entityType] = self.__readGenerations().get(entityType)
+        self.__versions[entityType] = versions
+        self.__deltas[entityType] = (deltaChanged, deltaDeleted)
+        self.__tables[entityType] = table
+        return table
+
+    def findReferences(self, entityType, ID):
+        """This function takes an entity type and an ID and returns the IDs of the records of that type which contain ID
+        as a foreign key. As the records are only held in a dictionary, every record has to be checked."""
+        positions = self.__foreignKeyPositions(entityType)
+        output = []
+        table = self.__tables[entityType]
+        for recordID in table:
+            row = table[recordID].exportRow()
+            for position in positions:
+                if row[position] == ID:
+                    output.append(recordID)
+                    break
+        return output
+
+    def record(self, entry):
+        """This function appends the change to the journal file. Only the change is written, rather than the whole
+        database."""
+        self.__fM.appendFile(self.__journalName, entry)
+
+    def loadJournal(self):
+        """This function returns the changes in the journal. The journal from a save that did not finish is returned
+        first as its changes came before those in the current journal."""
+        return self.__fM.loadRecords(self.__savingJournalName) + self.__fM.loadRecords(self.__journalName)
+
+    def prepareSave(self, changed, deleted):
+        """This function locks the directory (until writeSave has finished) and adds the changed and deleted records to
+        the delta of each entity type. If another copy of the software has saved the type since it was loaded, its
+        changes are merged in first. It then takes a copy of the rows that need to be written (so that records can be
+        added, changed or deleted while the save is written). For most saves only the records in the delta are copied,
+        but if the delta has grown too large the whole table is copied so the base can be rewritten. Finally it moves
+        the current journal aside - changes made from now on go into a new journal as they will not be part of this
+        save."""
+        self.__directoryLock.acquire()
+        try:
+            data = {}
+            generations = self.__readGenerations()
+            for entityType in set(changed) | set(deleted):
+                typeChanged = changed.get(entityType, set())
+                typeDeleted = deleted.get(entityType, set())
+                if generations.get(entityType) != self.__stamps[entityType]:
+                    # Another copy of the software has saved this type since it was loaded, so its changes are merged in
+                    typeChanged, typeDeleted = self.__merge(entityType, typeChanged, typeDeleted)
+                    self.__stamps[entityType] = generations.get(entityType)
+                deltaChanged, deltaDeleted = self.__deltas[entityType]
+                deltaChanged.update(typeChanged)
+                deltaChanged.difference_update(typeDeleted)
+                deltaDeleted.update(typeDeleted)
+                deltaDeleted.difference_update(typeChanged)
+                table = self.__tables[entityType]
+                """The version number of each saved record goes up by one. The new numbers are only kept once the save 
+                has been written (None means the record has been deleted)."""
+                newVersions = {}
+                for ID in typeChanged:
+                    newVersions[ID] = self.__versions[entityType].get(ID, 0) + 1
+                for ID in typeDeleted:
+                    newVersions[ID] = None
+                versions = dict(self.__versions[entityType])
+                versions.update(newVersions)
+                if len(deltaChanged) + len(deltaDeleted) > self.__compactRatio * len(table):
+                    data[entityType] = ("base", self.__tableToRows(table, versions), [], newVersions)
+                else:
+                    rows = []
+                    for ID in deltaChanged:
+                        rows.append((ID,) + tuple(table[ID].exportRow()) + (versions[ID],))
+                    data[entityType] = ("delta", rows, list(deltaDeleted), newVersions)
+            self.__rotateJournal()
+        except BaseException:
+            self.__directoryLock.release()
+            raise
+        return data
+
+    def writeSave(self, prepared):
+        """This function takes the rows copied by prepareSave and writes each entity type's base or delta file. The
+        directory is unlocked once it has finished."""
+        try:
+            """Giving each saved type a new generation before its files are written. If the software crashes part way 
+            through the save, the other copies will still know the files have changed."""
+            generations = self.__readGenerations()
+            for entityType in prepared:
+                generations[entityType] = uuid.uuid4().hex
+            if len(prepared) > 0:
+                self.__fM.saveFile(self.__generationsName, generations)
+            for entityType in prepared:
+                kind, rows, deleted, newVersions = prepared[entityType]
+                fields = getattr(entities, entityType).fields + ["_version"]
+                if kind == "base":
+                    self.__fM.saveBytes(self.__tableName(entityType), self.__codec.encode(fields, rows))
+                    """The new base contains every record in the delta, so the delta is no longer needed. If the 
+                    software crashes before it is deleted, applying it again to the new base changes nothing."""
+                    self.__fM.deleteFile(self.__deltaName(entityType))
+                    self.__deltas[entityType] = (set(), set())
+                else:
+                    self.__fM.saveBytes(self.__deltaName(entityType), self.__codec.encode(fields, rows, deleted))
+                # The save has been written, so the new version numbers of the saved records are kept
+                for ID in newVersions:
+                    if newVersions[ID] is None:
+                        self.__versions[entityType].pop(ID, None)
+                    else:
+                        self.__versions[entityType][ID] = newVersions[ID]
+                self.__stamps[entityType] = generations[entityType]
+            # As the files now contain every change in the journal that was moved aside, it is no longer needed
+            self.__fM.deleteFile(self.__savingJournalName)
+        finally:
+            self.__directoryLock.release()
+
+    def hasAllocatedIDs(self):
+        return self.__fM.fileExists(self.__idsName)
+
+    def allocateIDs(self, count, first=1):
+        """The next ID to be allocated is stored in the ids file. It is read and rewritten while holding the directory
+        lock, so two copies of the software can never be given the same IDs."""
+        with self.__directoryLock:
+            try:
+                nextID = self.__fM.loadFile(self.__idsName)
+            except FileNotFoundError:
+                nextID = first
+            self.__fM.saveFile(self.__idsName, nextID + count)
+        return nextID
+
+    def getConflicts(self):
+        """This function returns the list of [entityType, ID] pairs of the records whose changes could not be saved as
+        another copy of the software saved a change to them first. The list is then emptied."""
+        conflicts = self.__conflicts
+        self.__conflicts = []
+        return conflicts
+
+    def setReloadListener(self, listener):
+        self.__reloadListener = listener
+
+    def close(self):
+        """This function releases the lock on this copy's journal, as the software is no longer using it"""
+        self.__instanceLock.release()
+        self.__fM.deleteFile(self.__instanceLockName(self.__name))
+
+    def __merge(self, entityType, changed, deleted):
+        """This function takes an entity type and the sets of IDs of the records of that type changed and deleted by
+        this copy of the software since the last save. It is called when another copy has saved the type in the
+        meantime. The records are re-read from the files and this copy's changes are applied to them, unless a record
+        has a different version in the files to the one this copy loaded (i.e. another copy saved it first) - that is a
+        conflict and the saved record is kept. It returns the sets of IDs of the changes which were kept."""
+        table = self.__tables[entityType]
+        versions = self.__versions[entityType]
+        savedTable, savedVersions, deltaChanged, deltaDeleted = self.__readTable(entityType)
+        keptChanged = set()
+        keptDeleted = set()
+        for ID in changed:
+            if versions.get(ID) == savedVersions.get(ID):
+                savedTable[ID] = table[ID]
+                keptChanged.add(ID)
+            else:
+                self.__conflicts.append([entityType, ID])
+        for ID in deleted:
+            # A record deleted by both copies is not a conflict
+            if versions.get(ID) == savedVersions.get(ID) or ID not in savedTable:
+                savedTable.pop(ID, None)
+                keptDeleted.add(ID)
+            else:
+                self.__conflicts.append([entityType, ID])
+        # The records are replaced in the same dictionary, as it is also used by the EntityHandler
+        table.clear()
+        table.update(savedTable)
+        versions.clear()
+        versions.update(savedVersions)
+        self.__deltas[entityType] = (deltaChanged, deltaDeleted)
+        if self.__reloadListener is not None:
+            self.__reloadListener(entityType)
+        return keptChanged, keptDeleted
+
+    def __readTable(self, entityType):
+        """This function takes an entity type and reads its base snapshot and delta files. It returns the dictionary of
+        records, the dictionary of their version numbers and the sets of IDs changed and deleted in the delta. A file
+        written by an older version of the software (a pickled dictionary of entity objects) is rewritten as a
+        snapshot."""
+        try:
+            data = self.__fM.loadBytes(self.__tableName(entityType))
+        except FileNotFoundError:
+            data = None
+        if data is None:
+            table = {}
+            versions = {}
+        elif self.__codec.isSnapshot(data):
+            fields, rows, deleted = self.__codec.decode(data)
+            table, versions = self.__rowsToTable(entityType, fields, rows)
+        else:
+            table = pickle.loads(data)
+            versions = {}
+            self.__saveTable(entityType, table)
+        deltaChanged = set()
+        deltaDeleted = set()
+        # Applying the changes stored in the delta file (if there is one) on top of the base snapshot
+        try:
+            data = self.__fM.loadBytes(self.__deltaName(entityType))
+        except FileNotFoundError:
+            data = None
+        if data is not None:
+            fields, rows, deleted = self.__codec.decode(data)
+            deltaTable, deltaVersions = self.__rowsToTable(entityType, fields, rows)
+            table.update(deltaTable)
+            versions.update(deltaVersions)
+            deltaChanged.update(deltaTable.keys())
+            for ID in deleted:
+                table.pop(ID, None)
+                versions.pop(ID, None)
+                deltaDeleted.add(ID)
+        return table, versions, deltaChanged, deltaDeleted
+
+    def __saveTable(self, entityType, table):
+        """This function takes an entity type and a dictionary of records of that type and writes it to its file"""
+        fields = getattr(entities, entityType).fields + ["_version"]
+        self.__fM.saveBytes(self.__tableName(entityType), self.__codec.encode(fields, self.__tableToRows(table, {})))
+
+    def __tableToRows(self, table, versions):
+        """This function takes a dictionary of records and a dictionary of their version numbers and returns a list of
+        rows - a tuple of the ID of each record followed by the values of its fields and its version number"""
+        rows = []
+        for ID in table:
+            rows.append((ID,) + tuple(table[ID].exportRow()) + (versions.get(ID, 0),))
+        return rows
+
+    def __rowsToTable(self, entityType, fields, rows):
+        """This function takes an entity type, the field names stored in a snapshot and the rows of the snapshot and
+        returns a dictionary of entity objects and a dictionary of their version numbers. If the fields of the entity
+        type have changed since the snapshot was written, each value is matched to its field by name and any new field
+        is set to None. Snapshots written before records had version numbers give every record version 0."""
+        entityClass = getattr(entities, entityType)
+        table = {}
+        versions = {}
+        if fields == entityClass.fields + ["_version"]:
+            for row in rows:
+                record = entityClass()
+                record.importRow(row[1:-1])
+                table[row[0]] = record
+                versions[row[0]] = row[-1]
+        else:
+            # Finding the position in each row of every current field (or None if it was not stored)
+            positions = []
+            for field in entityClass.fields:
+                if field in fields:
+                    positions.append(fields.index(field) + 1)
+                else:
+                    positions.append(None)
+            for row in rows:
+                values = []
+                for position in positions:
+                    if position is None:
+                        values.append(None)
+                    else:
+                        values.append(row[position])
+                record = entityClass()
+                record.importRow(values)
+                table[row[0]] = record
+                if "_version" in fields:
+                    versions[row[0]] = row[fields.index("_version") + 1]
+                else:
+                    versions[row[0]] = 0
+        return table, versions
+
+    def __foreignKeyPositions(self, entityType):
+        """This function takes an entity type and returns the indexes of its foreign keys in a row from exportRow"""
+        entityClass = getattr(entities, entityType)
+        positions = []
+        for field in entityClass.foreignKeys:
+            positions.append(entityClass.fields.index(field))
+        return positions
+
+    def __readGenerations(self):
+        """This function returns the dictionary of the current generation of each entity type (see self.__stamps). A type
+        which has never been saved is not in the dictionary."""
+        try:
+            return self.__fM.loadFile(self.__generationsName)
+        except FileNotFoundError:
+            return {}
+
+    def __tableName(self, entityType):
+        """This function takes an entity type and returns the name of the file its base snapshot is stored in"""
+        return os.path.join(self.__directory, entityType + ".p")
+
+    def __deltaName(self, entityType):
+        """This function takes an entity type and returns the name of the file its delta is stored in"""
+        return os.path.join(self.__directory, entityType + ".delta.p")
+
+    def __journalFile(self, name):
+        return os.path.join(self.__directory, "journal-" + name + ".p")
+
+    def __savingJournalFile(self, name):
+        return os.path.join(self.__directory, "journal-" + name + ".saving.p")
+
+    def __instanceLockName(self, name):
+        return os.path.join(self.__directory, "instance-" + name + ".lock")
+
+    def __createDirectory(self):
+        """This function creates the directory the entity files are stored in. If there is an entities.p file from an
+        older version of the software (which stored every entity type in one file) then it is split into one file per
+        entity type."""
+        # Another copy of the software may be creating the directory at the same time
+        os.makedirs(self.__directory, exist_ok=True)
+        try:
+            oldEntities = self.__fM.loadFile("entities.p")
+        except FileNotFoundError:
+            oldEntities = {}
+        for entityType in oldEntities:
+            self.__saveTable(entityType, oldEntities[entityType])
+
+    def __adoptJournals(self):
+        """This function finds the journals of any copies of the software which are no longer running (their lock can
+        be acquired) and moves their changes into this copy's journal, so they are re-applied and saved by this copy"""
+        with self.__directoryLock:
+            names = set()
+            for filename in os.listdir(self.__directory):
+                if filename.startswith("journal-") or filename.startswith("instance-"):
+                    # Removing the start of the file name and its extensions to leave the name of the copy
+                    names.add(filename.split(".")[0].split("-", 1)[1])
+            names.discard(self.__name)
+            for name in names:
+                lock = fileManagement.FileLock(self.__instanceLockName(name))
+                if lock.acquire(False):
+                    self.__adoptJournal(self.__savingJournalFile(name))
+                    self.__adoptJournal(self.__journalFile(name))
+                    lock.release()
+                    self.__fM.deleteFile(self.__instanceLockName(name))
+            # Older versions of the software used a single journal which did not have a name
+            self.__adoptJournal(os.path.join(self.__directory, "journal.saving.p"))
+            self.__adoptJournal(os.path.join(self.__directory, "journal.p"))
+
+    def __adoptJournal(self, filename):
+        """This function takes the name of a journal file, appends its changes to this copy's journal and deletes it"""
+        for entry in self.__fM.loadRecords(filename):
+            self.__fM.appendFile(self.__journalName, entry)
+        self.__fM.deleteFile(filename)
+
+    def __rotateJournal(self):
+        """This function moves the current journal aside (to self.__savingJournalName) when a save starts. If an earlier
+        save failed and its journal is still there, the current journal is added to the end of it instead."""
+        if self.__fM.fileExists(self.__savingJournalName):
+            for entry in self.__fM.loadRecords(self.__journalName):
+                self.__fM.appendFile(self.__savingJournalName, entry)
+            self.__fM.deleteFile(self.__journalName)
+        else:
+            self.__fM.renameFile(self.__journalName, self.__savingJournalName)
+
+
+class SqliteBackend(StorageBackend):
+    """This storage backend stores the database in a local SQLite file using the sqlite3 module (so no database server
+    is needed). Each entity type has its own table with a column for each of its fields, and the foreign key columns
+    are indexed. Records are read from the file when they are needed rather than all being kept in memory. As every
+    change is written straight to the file, several copies of the software can share it - SQLite locks the file itself
+    while a change is being written, so there is never an out of date copy of a record to conflict with."""
+    def __init__(self, filename="entities.db"):
+        """The constructor takes the name of the database file as its input and opens a connection to it. The connection
+        is shared by the threads of the software (e.g. the autosave thread) and the EntityHandler makes sure only one of
+        them changes the database at a time."""
+        self.__connection = sqlite3.connect(filename, check_same_thread=False)
+        # Write-ahead logging lets records be read while a change is being committed
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+
+    def loadTable(self, entityType):
+        """This function takes an entity type, creates its table (and the indexes on its foreign keys) if they do not
+        already exist and returns a SqliteTable for it"""
+        changing = self.__connection.in_transaction
+        fields = getattr(entities, entityType).fields
+        """Columns are given no type so SQLite stores each value as the type it is given. The ID column is called '_ID' 
+        so it can never clash with the name of a field."""
+        columns = ['"_ID" PRIMARY KEY']
+        for field in fields:
+            columns.append('"' + field + '"')
+        self.__connection.execute('CREATE TABLE IF NOT EXISTS "' + entityType + '" (' + ", ".join(columns) + ')')
+        for field in getattr(entities, entityType).foreignKeys:
+            self.__connection.execute('CREATE INDEX IF NOT EXISTS "' + entityType + '_' + field + '" ON "' + entityType +
+                                      '" ("' + field + '")')
+        # A table loaded part of the way through a batch is created along with the batch's changes (see allocateIDs)
+        if not changing:
+            self.__connection.commit()
+        return SqliteTable(self.__connection, entityType)
+
+    def hasAllocatedIDs(self):
+        self.__createIDTable()
+        return self.__connection.execute('SELECT 1 FROM "_ids" WHERE "name" = ?', ("next",)).fetchone() is not None
+
+    def allocateIDs(self, count, first=1):
+        """The next ID to be allocated is stored in the '_ids' table. It is increased and read back in one transaction,
+        during which SQLite stops any other copy of the software writing to the file. If a change which has not been
+        committed yet is being made (e.g. a batch needs more IDs part of the way through) then the new IDs are committed
+        along with that change rather than on their own, so the change is never committed half way through. Until then
+        no other copy can write to the file, so it can not be given the same IDs."""
+        changing = self.__connection.in_transaction
+        self.__createIDTable()
+        self.__connection.execute('INSERT OR IGNORE INTO "_ids" VALUES (?, ?)', ("next", first))
+        self.__connection.execute('UPDATE "_ids" SET "value" = "value" + ? WHERE "name" = ?', (count, "next"))
+        nextID = self.__connection.execute('SELECT "value" FROM "_ids" WHERE "name" = ?', ("next",)).fetchone()[0]
+        if not changing:
+            self.__connection.commit()
+        return nextID - count
+
+    def findReferences(self, entityType, ID):
+        """This function takes an entity type and an ID and returns the IDs of the records of that type which contain ID
+        as a foreign key. Each foreign key column has an index so no records need to be checked one by one."""
+        output = []
+        for field in getattr(entities, entityType).foreignKeys:
+            cursor = self.__connection.execute('SELECT "_ID" FROM "' + entityType + '" WHERE "' + field + '" = ?', (ID,))
+            for row in cursor:
+                if row[0] not in output:
+                    output.append(row[0])
+        return output
+
+    def record(self, entry):
+        """The change has already been written to the database file by the SqliteTable, so committing it is all that is
+        needed to make sure it is not lost"""
+        self.__connection.commit()
+
+    def loadJournal(self):
+        """SQLite recovers any unfinished changes itself, so there is never anything to re-apply"""
+        return []
+
+    def prepareSave(self, changed, deleted):
+        """Every change is committed as it is made, so there is nothing to copy"""
+        self.__connection.commit()
+        return None
+
+    def writeSave(self, prepared):
+        pass
+
+    def close(self):
+        self.__connection.commit()
+        self.__connection.close()
+
+    def __createIDTable(self):
+        """This function creates the table storing the next ID to be allocated if it does not already exist. The name
+        starts with an underscore so it can never clash with the name of an entity type."""
+        self.__connection.execute('CREATE TABLE IF NOT EXISTS "_ids" ("name" PRIMARY KEY, "value")')
+
+
+class SqliteTable(object):
+    """This object behaves like a dictionary of the records of one entity type, but reads and writes the records in a
+    SQLite table. An entity object taken from it is a copy, so after changing one it must be put back into the table."""
+    def __init__(self, connection, entityType):
+        """The constructor takes a sqlite3 connection and the entity type of the table as its input"""
+        self.__connection = connection
+        self.__entityType = entityType
+        self.__fields = getattr(entities, entityType).fields
+        self.__name = '"' + entityType + '"'
+
+    def __getitem__(self, ID):
+        """This function takes an ID and returns an entity object containing the values of the matching row"""
+        columns = '"' + '", "'.join(self.__fields) + '"'
+        row = self.__connection.execute("SELECT " + columns + " FROM " + self.__name + ' WHERE "_ID" = ?', (ID,)).fetchone()
+        if row is None:
+            raise KeyError(ID)
+        record = getattr(entities, self.__entityType)()
+        values = []
+        for value in row:
+            values.append(self.__decode(value))
+        record.importRow(values)
+        return record
+
+    def __setitem__(self, ID, record):
+        """This function takes an ID and an entity object and stores the object's values in the row matching ID (adding
+        a new row if there is not one already)"""
+        values = [ID]
+        for value in record.exportRow():
+            values.append(self.__encode(value))
+        placeholders = ", ".join(["?"] * len(values))
+        self.__connection.execute("INSERT OR REPLACE INTO " + self.__name + " VALUES (" + placeholders + ")", values)
+
+    def __delitem__(self, ID):
+        self.__connection.execute("DELETE FROM " + self.__name + ' WHERE "_ID" = ?', (ID,))
+
+    def __contains__(self, ID):
+        return self.__connection.execute("SELECT 1 FROM " + self.__name + ' WHERE "_ID" = ?', (ID,)).fetchone() is not None
+
+    def __len__(self):
+        return self.__connection.execute("SELECT COUNT(*) FROM " + self.__name).fetchone()[0]
+
+    def __iter__(self):
+        """This function returns an iterator over the IDs of the records. The IDs are fetched first so that records can
+        be deleted while iterating."""
+        return iter(self.keys())
+
+    def keys(self):
+        output = []
+        for row in self.__connection.execute('SELECT "_ID" FROM ' + self.__name):
+            output.append(row[0])
+        return output
+
+    def __encode(self, value):
+        """This function takes a value and returns it in a form SQLite can store. Strings and numbers are stored as they
+        are, anything else (e.g. dates and lists) is pickled."""
+        if value is None or isinstance(value, (str, int, float)):
+            return value
+        return pickle.dumps(value)
+
+    def __decode(self, value):
+        """This function reverses __encode. Bytes can only have come from pickling as every other value is stored as
+        it is."""
+        if isinstance(value, bytes):
+            return pickle.loads(value)
+        return value
@@ -74,4 +74,27 @@ def presenceCheck(string):
     # If the string is blank then set 'message' to a corresponding error
     if string == "":
         message = "Field required"
-    return message
\ No newline at end of file
+    return message
+
+
+def validateHouseNumber(string):
+    """This function takes a string as its input and returns a string 'message' which determines whether or not the input
+    is a valid house number"""
+    message = ""
+    # Ensuring the number is no longer than 5 digits
+    if len(string) > 5:
+        message = "House number too long"
+    # Ensuring the number contains only numerical characters or is blank
+    if not string.isdigit() and string != "":
+        message = "This is not a number"
+    return message
+
+
+def validateMedicalDetails(string):
+    """This function takes a string as its input and returns a string 'message' which determines whether or not the input
+    is valid medical details"""
+    message = ""
+    # Ensuring the input is not longer than 250 characters
+    if len(string) > 250:
+        message = "Description too long"
+    return message